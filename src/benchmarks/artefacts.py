@@ -0,0 +1,113 @@
+# coding: utf-8
+"""Compare `artefact_mask` with the implementation it replaced.
+
+The reference labels the full-resolution foreground and finds the largest component with a loop
+over all labels. Both are run on synthetic depth maps of an object with many small blobs around
+it, like the speckles left by skin removal, and the agreement of their masks and their time per
+frame are printed, for keeping only the largest component and for keeping components above a
+minimum area, at each downsampling scale.
+
+usage: python -m benchmarks.artefacts [-h] [-f FRAMES] [-b BLOBS] [-a MIN_AREA] [-s SCALES [SCALES ...]]
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -f FRAMES, --frames FRAMES
+                            number of frames to measure over. Default is 50.
+  -b BLOBS, --blobs BLOBS   number of small blobs per frame. Default is 2000.
+  -a MIN_AREA, --min_area MIN_AREA
+                            minimum area of kept components. Default is 200.
+  -s SCALES [SCALES ...], --scales SCALES [SCALES ...]
+                            downsampling scales to measure. Default is 1 2 4.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from cv2 import cv2
+
+from utils.segmentation import artefact_mask
+
+
+def artefact_mask_reference(depth, mask, min_area=None):
+    """The previous `artefact_mask`, without printing on empty frames, and extended by a loop over labels for keeping
+    components of a minimum area."""
+    copy = np.copy(depth * 255).astype(np.uint8)
+    copy[mask] = 0
+    nb_components, output, stats, _ = cv2.connectedComponentsWithStats(copy, connectivity=4)
+    if nb_components < 2:
+        return mask
+
+    if min_area is None:
+        max_label, _ = max([(i, stats[i, cv2.CC_STAT_AREA]) for i in range(1, nb_components)], key=lambda x: x[1])
+        return output != max_label
+
+    result = np.ones(mask.shape, dtype=bool)
+    for i in range(1, nb_components):
+        if stats[i, cv2.CC_STAT_AREA] >= min_area:
+            result[output == i] = False
+    return result
+
+
+def blobs_frame(blobs, rng):
+    """Returns a normalized depth map and background mask of an object with many small blobs around it."""
+    h, w = 424, 512
+    depth = np.zeros((h, w), dtype=np.float32)
+    cv2.ellipse(depth, (w // 2, h // 2), (120, 160), rng.uniform(0, 180), 0, 360, 0.5, -1)
+    for _ in range(8):  # a few medium regions, e.g. parts of the object cut off by skin removal
+        cv2.circle(depth, (int(rng.integers(0, w)), int(rng.integers(0, h))), int(rng.integers(8, 16)), 0.6, -1)
+    ys, xs = rng.integers(0, h, blobs), rng.integers(0, w, blobs)
+    sizes = rng.integers(1, 4, blobs)
+    for x, y, s in zip(xs, ys, sizes):
+        depth[y:y + s, x:x + s] = 0.4
+    mask = depth == 0
+    return depth, mask
+
+
+def measure(fn, frames):
+    """Returns the results of a function on all frames and its mean time per frame in milliseconds."""
+    start = time.perf_counter()
+    results = [fn(depth, mask) for depth, mask in frames]
+    return results, (time.perf_counter() - start) / len(frames) * 1000
+
+
+def agreement(results, expected):
+    """Returns the mean fraction of equal pixels and the mean intersection over union of the kept pixels."""
+    equal = np.mean([np.mean(a == b) for a, b in zip(results, expected)])
+    iou = np.mean([np.count_nonzero(~a & ~b) / max(np.count_nonzero(~a | ~b), 1) for a, b in zip(results, expected)])
+    return equal, iou
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--frames', type=int, default=50, help="number of frames to measure over.")
+    parser.add_argument('-b', '--blobs', type=int, default=2000, help="number of small blobs per frame.")
+    parser.add_argument('-a', '--min_area', type=int, default=200, help="minimum area of kept components.")
+    parser.add_argument('-s', '--scales', type=int, nargs='+', default=[1, 2, 4],
+                        help="downsampling scales to measure.")
+    return parser.parse_args()
+
+
+def main(args):
+    cv2.setNumThreads(1)
+    rng = np.random.default_rng(0)
+    frames = [blobs_frame(args.blobs, rng) for _ in range(args.frames)]
+
+    # Frames without foreground must not raise
+    empty = np.zeros((424, 512), dtype=np.float32)
+    assert artefact_mask(empty, empty == 0) is not None
+
+    for min_area in (None, args.min_area):
+        mode = 'largest only' if min_area is None else f'area >= {min_area}'
+        expected, reference_ms = measure(lambda d, m: artefact_mask_reference(d, m, min_area), frames)
+        print(f"{mode}: reference {reference_ms:.2f}ms")
+
+        for scale in args.scales:
+            results, ms = measure(lambda d, m: artefact_mask(d, m, min_area=min_area, scale=scale), frames)
+            equal, iou = agreement(results, expected)
+            print(f"  scale {scale}: {ms:.2f}ms ({reference_ms / ms:.1f}x), "
+                  f"{equal * 100:.3f}% equal pixels, IoU of kept pixels {iou:.4f}")
+
+
+if __name__ == '__main__':
+    main(parse_args())
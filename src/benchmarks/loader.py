@@ -0,0 +1,213 @@
+# coding: utf-8
+"""Measure how fast `RGBDRealDataset` feeds a training loop.
+
+Generates a synthetic dataset in the layout written by `save_frame`, unless an existing
+dataset is given, and measures:
+
+- the time to construct the dataset, i.e. to index its files,
+- samples per second and megabytes read per second when iterating over it with a
+  `DataLoader`, as in `sample.py`, for each combination of worker count and batch size,
+- the time of each decoding stage of a sample, and
+- the peak resident memory of the main process and of the worker processes.
+
+Each combination runs in a fresh process, so that peak memory is not carried over from
+the ones measured before it.
+
+Results are printed and written to a JSON file for comparing storage formats and loaders.
+
+usage: python -m benchmarks.loader [-h] [-d DATASET] [-n FRAMES] [-s SEQUENCES] [-w WORKERS [WORKERS ...]]
+                                   [-b BATCH_SIZES [BATCH_SIZES ...]] [-m MAX_BATCHES] [-o OUTPUT]
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -d DATASET, --dataset DATASET
+                            existing dataset to benchmark. Default is a synthetic one.
+  -n FRAMES, --frames FRAMES
+                            number of frames of the synthetic dataset. Default is 512.
+  -s SEQUENCES, --sequences SEQUENCES
+                            number of sequences of the synthetic dataset. Default is 4.
+  -w WORKERS [WORKERS ...], --workers WORKERS [WORKERS ...]
+                            worker counts to measure. Default is 0 2 4.
+  -b BATCH_SIZES [BATCH_SIZES ...], --batch_sizes BATCH_SIZES [BATCH_SIZES ...]
+                            batch sizes to measure. Default is 1 4 16.
+  -m MAX_BATCHES, --max_batches MAX_BATCHES
+                            stop each measurement after this many batches. Default is 0, i.e. a full epoch.
+  -o OUTPUT, --output OUTPUT
+                            JSON file to write the results to. Default is loader_benchmark.json.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+from cv2 import cv2
+from torch.utils.data import DataLoader
+
+from utils import RGBDFrame, create_save_directories, save_frame
+from utils.data import RGBDRealDataset
+
+LIGHTING, MATERIALS, VIEWS = 'NA', 'DWC', ('front', 'back', 'rot')
+
+
+def synthesize(root, frames, sequences, seed=0):
+    """Writes a synthetic dataset of smooth random frames with a foreground blob in the middle."""
+    rng = np.random.default_rng(seed)
+    h, w = 424, 512
+    y, x = np.mgrid[0:h, 0:w]
+
+    for item_id in range(frames):
+        s = item_id % sequences
+        path = os.path.join(root, f'surface{s // len(VIEWS)}',
+                            f'{LIGHTING[s % 2]}{MATERIALS[s % 3]}_{VIEWS[s % len(VIEWS)]}')
+        create_save_directories(path)
+
+        color = cv2.resize(rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8), (w, h))
+        depth = cv2.resize(rng.random((h // 32, w // 32), dtype=np.float32), (w, h)) * 0.5 + 0.25
+        radius = rng.uniform(0.25, 0.45) * h
+        mask = (x - w / 2) ** 2 + (y - h / 2) ** 2 > radius ** 2
+        color[mask] = 0
+        depth[mask] = 0
+
+        save_frame(path, item_id // sequences, RGBDFrame(color, depth, mask, seq=item_id))
+
+
+def peak_rss():
+    """Returns the peak resident memory in megabytes of this process and of its finished children."""
+    scale = 1 / 1024 ** 2 if sys.platform == 'darwin' else 1 / 1024  # bytes on macOS, kilobytes elsewhere
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def sample_bytes(dataset, idx):
+    return sum(os.path.getsize(files[idx]) for files in (dataset.images, dataset.dmaps, dataset.nmaps, dataset.masks))
+
+
+def measure_stages(dataset, samples):
+    """Measures the mean time in milliseconds of each stage of loading a sample."""
+    stages = {'image': dataset.load_image, 'depth': dataset.load_depth,
+              'normals': dataset.load_normals, 'mask': dataset.load_mask}
+    idx = np.linspace(0, len(dataset) - 1, min(samples, len(dataset))).astype(int)
+
+    times = {}
+    for name, load in stages.items():
+        start = time.perf_counter()
+        for i in idx:
+            load(i)
+        times[name] = (time.perf_counter() - start) / len(idx) * 1000
+
+    # Share of normalizing the normals in loading them
+    nmaps = [np.load(dataset.nmaps[i]).astype(np.float32) for i in idx]
+    start = time.perf_counter()
+    for nmap in nmaps:
+        nmap /= nmap.max()
+    times['normals_normalize'] = (time.perf_counter() - start) / len(idx) * 1000
+    return times
+
+
+def measure_loader(dataset, workers, batch_size, max_batches, mean_bytes):
+    """Iterates over the dataset with a `DataLoader` and measures its throughput."""
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers)
+
+    samples, batches = 0, 0
+    start = time.perf_counter()
+    first_batch = None
+    for image, _ in loader:
+        if first_batch is None:
+            first_batch = time.perf_counter() - start
+        samples += image.shape[0]
+        batches += 1
+        if 0 < max_batches <= batches:
+            break
+    elapsed = time.perf_counter() - start
+
+    rss, rss_workers = peak_rss()
+    return {'workers': workers, 'batch_size': batch_size, 'samples': samples,
+            'seconds': elapsed, 'first_batch_seconds': first_batch,
+            'samples_per_second': samples / elapsed, 'mb_per_second': samples * mean_bytes / 1024 ** 2 / elapsed,
+            'peak_rss_mb': rss, 'peak_rss_workers_mb': rss_workers}
+
+
+def measure_isolated(root, workers, batch_size, max_batches, mean_bytes):
+    """Runs `measure_loader` on the dataset at the given path in a fresh process.
+
+    The peak memory reported by the OS covers the whole lifetime of a process, and that of its
+    children covers all workers reaped so far, so each measurement needs a process of its own.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_measure_process, args=(sender, root, workers, batch_size, max_batches, mean_bytes))
+    process.start()
+    sender.close()
+    try:
+        run = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"Measuring workers={workers} batch_size={batch_size} failed") from None
+    finally:
+        process.join()
+    return run
+
+
+def _measure_process(sender, root, workers, batch_size, max_batches, mean_bytes):
+    sender.send(measure_loader(RGBDRealDataset(root), workers, batch_size, max_batches, mean_bytes))
+    sender.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--dataset', type=str, default=None,
+                        help="existing dataset to benchmark. Default is a synthetic one.")
+    parser.add_argument('-n', '--frames', type=int, default=512, help="number of frames of the synthetic dataset.")
+    parser.add_argument('-s', '--sequences', type=int, default=4,
+                        help="number of sequences of the synthetic dataset.")
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[0, 2, 4], help="worker counts to measure.")
+    parser.add_argument('-b', '--batch_sizes', type=int, nargs='+', default=[1, 4, 16], help="batch sizes to measure.")
+    parser.add_argument('-m', '--max_batches', type=int, default=0,
+                        help="stop each measurement after this many batches. Default is 0, i.e. a full epoch.")
+    parser.add_argument('-o', '--output', type=str, default='loader_benchmark.json',
+                        help="JSON file to write the results to.")
+    return parser.parse_args()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.dataset
+        if root is None:
+            root = tmp
+            start = time.perf_counter()
+            synthesize(root, args.frames, args.sequences)
+            print(f"Synthesized {args.frames} frames in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        dataset = RGBDRealDataset(root)
+        construction = time.perf_counter() - start
+        print(f"Constructed dataset of {len(dataset)} samples in {construction * 1000:.1f}ms")
+
+        mean_bytes = np.mean([sample_bytes(dataset, i) for i in range(len(dataset))])
+        stages = measure_stages(dataset, 64)
+        print("Decode time per sample: " + ", ".join(f"{k} {v:.2f}ms" for k, v in stages.items()))
+
+        runs = []
+        for workers in args.workers:
+            for batch_size in args.batch_sizes:
+                run = measure_isolated(root, workers, batch_size, args.max_batches, mean_bytes)
+                runs.append(run)
+                print(f"workers={workers} batch_size={batch_size}: {run['samples_per_second']:.1f} samples/s, "
+                      f"{run['mb_per_second']:.1f} MB/s, peak RSS {run['peak_rss_mb']:.0f}MB "
+                      f"(workers {run['peak_rss_workers_mb']:.0f}MB)")
+
+    results = {'dataset': args.dataset or 'synthetic', 'samples': len(dataset),
+               'mean_sample_bytes': float(mean_bytes), 'construction_seconds': construction,
+               'stage_ms': stages, 'runs': runs}
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main(parse_args())
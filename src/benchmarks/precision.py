@@ -0,0 +1,99 @@
+# coding: utf-8
+"""Measure the cost of the numeric types of frames through the pipeline.
+
+Runs a synthetic raw frame through segmentation, surface normals, the preview, saving and
+loading with `RGBDRealDataset`, see `utils.precision`. For each way of storing depth maps,
+prints the time per frame of each stage, the bytes of the arrays it returns and the bytes of
+the saved files. The types themselves are checked by `tests/test_precision.py`.
+
+usage: python -m benchmarks.precision [-h] [-r REPEAT]
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -r REPEAT, --repeat REPEAT
+                            number of frames to time each stage over. Default is 20.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from cv2 import cv2
+
+from utils import RGBDFrame, create_save_directories, create_view, save_frame, set_precision
+from utils.data import RGBDRealDataset
+from utils.depth3d import dmap2norm
+from utils.segmentation import segment
+
+
+def raw_frame(seed=0):
+    """Returns a synthetic registered color image and depth map in millimeters, as given by the camera."""
+    rng = np.random.default_rng(seed)
+    h, w = 424, 512
+    color = cv2.resize(rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8), (w, h))
+    depth = cv2.resize(rng.uniform(300, 1700, (h // 32, w // 32)).astype(np.float32), (w, h))
+    return color, depth
+
+
+def timed(fn, repeat):
+    """Returns the result of a function and its mean time in milliseconds, after a first untimed call."""
+    fn()  # e.g. builds the skin lookup table
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def run(depth_storage, repeat):
+    """Runs a frame through the pipeline with the given depth storage and returns time and bytes of each stage."""
+    set_precision(depth_storage=depth_storage)
+    raw_color, raw_depth = raw_frame()
+    stages = {}
+
+    (color, depth, mask), ms = timed(lambda: segment(raw_color.copy(), raw_depth.copy()), repeat)
+    stages['segment'] = ms, color.nbytes + depth.nbytes + mask.nbytes
+
+    norms, ms = timed(lambda: dmap2norm(depth), repeat)
+    stages['dmap2norm'] = ms, norms.nbytes
+
+    frame = RGBDFrame(color, depth, mask)
+
+    view, ms = timed(lambda: create_view((color, depth, norms, mask)), repeat)
+    stages['create_view'] = ms, view.nbytes
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'surface0', 'ND_front')
+        create_save_directories(path)
+        _, ms = timed(lambda: save_frame(path, 0, frame, index=False), repeat)
+        saved = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+        stages['save_frame'] = ms, saved
+
+        dataset = RGBDRealDataset(root)
+        loaded, ms = timed(lambda: (dataset.load_image(0), dataset.load_depth(0),
+                                    dataset.load_normals(0), dataset.load_mask(0)), repeat)
+        stages['load'] = ms, sum(a.nbytes for a in loaded)
+
+        error = np.abs(loaded[1] - depth).max()
+        print(f"Largest error of saved depth: {error:.2e}")
+    return stages
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=20, help="number of frames to time each stage over.")
+    return parser.parse_args()
+
+
+def main(args):
+    cv2.setNumThreads(1)
+    for depth_storage in (np.float32, np.uint16):
+        print(f"Depth stored as {np.dtype(depth_storage)}:")
+        for name, (ms, nbytes) in run(depth_storage, args.repeat).items():
+            print(f"  {name:12} {ms:7.2f}ms {nbytes:10,} bytes")
+    set_precision()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,150 @@
+# coding: utf-8
+"""Validate and benchmark the NumPy registration against libfreenect2.
+
+With a Kinect connected, `--capture N` records N raw frames together with the output
+of libfreenect2's `Registration` and the camera parameters into a reference file.
+Without `--capture`, the NumPy registration is applied to the frames of the reference
+file, its outputs are compared to libfreenect2's, and its throughput is measured for
+single frames and for batches. Without a reference file, only throughput is measured,
+on random frames with typical camera parameters.
+
+usage: python -m benchmarks.registration [-h] [-c N] [-b BATCH] [-r REPEAT] [reference]
+
+positional arguments:
+  reference                 reference .npz file to create or validate against.
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -c N, --capture N         record N reference frames from the connected device.
+  -b BATCH, --batch BATCH   batch size for the throughput measurement. Default is 8.
+  -r REPEAT, --repeat REPEAT
+                            number of timed runs. Default is 20.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.calibration import COLOR_PARAMS, IR_PARAMS
+from utils.registration import Registration
+
+# Typical parameters of a Kinect v2, used when no reference is given
+TYPICAL_IR = {'fx': 365.5, 'fy': 365.5, 'cx': 257.0, 'cy': 205.0,
+              'k1': 0.09, 'k2': -0.27, 'k3': 0.09, 'p1': 0.0, 'p2': 0.0}
+TYPICAL_COLOR = dict({p: 0.0 for p in COLOR_PARAMS},
+                     fx=1081.37, fy=1081.37, cx=959.5, cy=539.5, shift_d=863.0, shift_m=52.0,
+                     mx_x1y0=0.6506, my_x0y1=0.6506)
+
+
+def capture(outfile, n):
+    """Records raw frames and libfreenect2's registration of them."""
+    from pylibfreenect2 import LoggerLevel, createConsoleLogger, setGlobalLogger
+    from pylibfreenect2.libfreenect2 import Freenect2, Frame, FrameMap, FrameType, Registration as Reference
+    from pylibfreenect2.libfreenect2 import SyncMultiFrameListener, CpuPacketPipeline
+    from utils.calibration import params2dict
+
+    setGlobalLogger(createConsoleLogger(LoggerLevel.NONE))
+    fn = Freenect2()
+    if fn.enumerateDevices() == 0:
+        raise RuntimeError("No device connected!")
+
+    device = fn.openDevice(fn.getDeviceSerialNumber(0), pipeline=CpuPacketPipeline())
+    listener = SyncMultiFrameListener(FrameType.Color | FrameType.Ir | FrameType.Depth)
+    device.setColorFrameListener(listener)
+    device.setIrAndDepthFrameListener(listener)
+    device.start()
+
+    ir_params, color_params = device.getIrCameraParams(), device.getColorCameraParams()
+    registration = Reference(ir_params, color_params)
+
+    data = {k: [] for k in ('color', 'depth', 'undistorted', 'registered', 'registered_filtered', 'bigdepth')}
+    for _ in range(n):
+        frames = FrameMap()
+        listener.waitForNewFrame(frames)
+        color, depth = frames[FrameType.Color], frames[FrameType.Depth]
+        data['color'].append(np.copy(color.asarray()))
+        data['depth'].append(np.copy(depth.asarray(np.float32)))
+
+        for enable_filter in (False, True):
+            undistorted, registered = Frame(512, 424, 4), Frame(512, 424, 4)
+            bigdepth = Frame(1920, 1082, 4)
+            registration.apply(color, depth, undistorted, registered, enable_filter=enable_filter, bigdepth=bigdepth)
+            if enable_filter:
+                data['registered_filtered'].append(np.copy(registered.asarray(np.uint8)))
+                data['bigdepth'].append(np.copy(bigdepth.asarray(np.float32))[1:-1])
+            else:
+                data['undistorted'].append(np.copy(undistorted.asarray(np.float32)))
+                data['registered'].append(np.copy(registered.asarray(np.uint8)))
+        listener.release(frames)
+
+    device.stop()
+    device.close()
+
+    calibration = {'ir': params2dict(ir_params, IR_PARAMS), 'color': params2dict(color_params, COLOR_PARAMS)}
+    np.savez_compressed(outfile, calibration=json.dumps(calibration), **{k: np.stack(v) for k, v in data.items()})
+
+
+def validate(reference, registration):
+    """Prints how closely the NumPy registration reproduces libfreenect2's outputs."""
+    undistorted, registered = registration.apply(reference['color'], reference['depth'])
+    _, filtered, bigdepth = registration.apply(reference['color'], reference['depth'], enable_filter=True, bigdepth=True)
+    expected_bigdepth = np.where(np.isinf(reference['bigdepth']), 0, reference['bigdepth'])
+
+    print(f"undistorted: max abs error {np.abs(undistorted - reference['undistorted']).max():.4f}mm")
+    print(f"registered: {np.mean(np.all(registered == reference['registered'], axis=-1)):.4%} pixels equal")
+    print(f"registered (filtered): "
+          f"{np.mean(np.all(filtered == reference['registered_filtered'], axis=-1)):.4%} pixels equal")
+    print(f"bigdepth: {np.mean(bigdepth == expected_bigdepth):.4%} pixels equal")
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("reference", nargs='?', help="reference .npz file to create or validate against.")
+    parser.add_argument("-c", "--capture", type=int, default=0, metavar='N',
+                        help="record N reference frames from the connected device.")
+    parser.add_argument("-b", "--batch", type=int, default=8, help="batch size for the throughput measurement.")
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="number of timed runs.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.capture > 0:
+        if not args.reference:
+            raise SystemExit("A reference file is needed for saving captured frames.")
+        capture(args.reference, args.capture)
+        print(f"Saved {args.capture} reference frames to {args.reference}")
+        raise SystemExit
+
+    start = time.perf_counter()
+    if args.reference:
+        reference = np.load(args.reference)
+        registration = Registration.from_calibration(json.loads(str(reference['calibration'])))
+        color, depth = reference['color'][:1], reference['depth'][:1]
+    else:
+        reference = None
+        registration = Registration(TYPICAL_IR, TYPICAL_COLOR)
+        rng = np.random.default_rng(0)
+        color = rng.integers(0, 256, (1, 1080, 1920, 4), dtype=np.uint8)
+        depth = rng.uniform(500, 4500, (1, 424, 512)).astype(np.float32)
+    print(f"Precomputing maps: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    if reference is not None:
+        validate(reference, registration)
+
+    colors, depths = np.repeat(color, args.batch, axis=0), np.repeat(depth, args.batch, axis=0)
+    for name, kwargs in (("plain", {}), ("filter+bigdepth", {'enable_filter': True, 'bigdepth': True})):
+        single = timeit(lambda: registration.apply(color[0], depth[0], **kwargs), args.repeat)
+        batch = timeit(lambda: registration.apply(colors, depths, **kwargs), args.repeat) / args.batch
+        print(f"{name}: {single:.2f}ms per frame, {batch:.2f}ms per frame in batches of {args.batch}")
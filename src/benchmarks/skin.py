@@ -0,0 +1,95 @@
+# coding: utf-8
+"""Compare the lookup-table skin classifier against per-frame HSV conversion.
+
+Measures how many pixels of the skin mask agree with the original HSV-based
+implementation and the time per frame of both, on a corpus of color images.
+Images are resized to the 512 x 424 resolution of the registered frames.
+
+usage: python -m benchmarks.skin [-h] [-r REPEAT] [paths ...]
+
+positional arguments:
+  paths                     images or directories of images. Default is ../samples.
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -r REPEAT, --repeat REPEAT
+                            number of timed runs per image. Default is 100.
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.segmentation import mask_skin
+
+IMAGE_EXTS = ('.png', '.tiff', '.jpg')
+
+
+def mask_skin_hsv(im_color):
+    """The original skin classifier, kept as reference."""
+    lower = np.array([0, 0, 0], dtype="uint8")
+    upper = np.array([50, 255, 255], dtype="uint8")
+
+    converted = cv2.cvtColor(im_color, cv2.COLOR_BGR2HSV)
+    skin_mask = cv2.inRange(converted, lower, upper)
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+    skin_mask = cv2.erode(skin_mask, kernel, iterations=2)
+    skin_mask = cv2.dilate(skin_mask, kernel, iterations=2)
+
+    skin_mask = cv2.GaussianBlur(skin_mask, (5, 5), 0)
+    skin_mask = skin_mask != 0
+    return skin_mask
+
+
+def list_images(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                yield from (os.path.join(root, f) for f in sorted(files) if f.endswith(IMAGE_EXTS))
+        else:
+            yield path
+
+
+def timeit(fn, im, repeat):
+    fn(im)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(im)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs='*', default=['../samples'], help="images or directories of images.")
+    parser.add_argument("-r", "--repeat", type=int, default=100, help="number of timed runs per image.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    results = []
+    for infile in list_images(args.paths):
+        im = cv2.imread(infile)
+        if im is None:
+            continue
+        im = cv2.resize(im, (512, 424), interpolation=cv2.INTER_AREA)
+
+        expected, actual = mask_skin_hsv(im), mask_skin(im)
+        agreement = np.mean(expected == actual)
+        union = np.logical_or(expected, actual).sum()
+        iou = np.logical_and(expected, actual).sum() / union if union else 1.0
+
+        t_hsv = timeit(mask_skin_hsv, im, args.repeat)
+        t_lut = timeit(mask_skin, im, args.repeat)
+        results.append((agreement, iou, t_hsv, t_lut))
+        print(f"{infile}: agreement={agreement:.4f} IoU={iou:.4f} hsv={t_hsv:.3f}ms lut={t_lut:.3f}ms")
+
+    if results:
+        agreement, iou, t_hsv, t_lut = np.mean(results, axis=0)
+        print(f"Mean over {len(results)} images: agreement={agreement:.4f} IoU={iou:.4f} "
+              f"hsv={t_hsv:.3f}ms lut={t_lut:.3f}ms saved={t_hsv - t_lut:.3f}ms per frame")
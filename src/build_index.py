@@ -0,0 +1,49 @@
+# coding: utf-8
+"""Build the metadata index of each sequence of an existing dataset.
+
+Datasets recorded with `main.py` get their index while saving frames. This script
+computes it for datasets recorded before, reading the color image, depth map and
+mask of every frame in parallel. The modification time of a depth map stands in for the capture
+time of its frame.
+
+usage: build_index.py [-h] [-j JOBS] [-f] path
+
+positional arguments:
+  path                      root directory of the dataset.
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -j JOBS, --jobs JOBS      number of worker processes. Default is the number of CPUs.
+  -f, --force               rebuild indexes which already exist.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.metadata import INDEX_COLUMNS, INDEX_FILE, list_frames, list_sequences, load_frame_metadata, save_index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str, help="root directory of the dataset.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes.")
+    parser.add_argument("-f", "--force", action='store_true', help="rebuild indexes which already exist.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    sequences = [seq_dir for _, _, seq_dir in list_sequences(args.path)
+                 if args.force or not os.path.exists(os.path.join(seq_dir, INDEX_FILE))]
+
+    # Index frames of all sequences together, so that small sequences do not leave workers idle
+    frames = [(seq_dir, item_id) for seq_dir in sequences for item_id in list_frames(seq_dir)]
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        entries = list(executor.map(load_frame_metadata, *zip(*frames), chunksize=16)) if frames else []
+
+    for seq_dir in sequences:
+        seq_entries = [entry for (d, _), entry in zip(frames, entries) if d == seq_dir]
+        save_index(seq_dir, {column: [entry[column] for entry in seq_entries] for column in INDEX_COLUMNS})
+        print(f"{seq_dir}: indexed {len(seq_entries)} frames")
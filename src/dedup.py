@@ -0,0 +1,76 @@
+# coding: utf-8
+"""Find near-duplicate frames in the sequences of a dataset.
+
+Frames are compared by the fingerprints in the metadata index of their sequence, so no
+frame data is loaded. Within each sequence, a frame is a duplicate if it is within the
+threshold of the last frame before it which is not. Duplicates are only listed, unless
+they should be dropped, which deletes their files and removes them from the index.
+
+usage: dedup.py [-h] [-t THRESHOLD] [--drop] path
+
+positional arguments:
+  path                      root directory of the dataset, or directory of a single sequence.
+
+optional arguments:
+  -h, --help                show this help message and exit
+  -t THRESHOLD, --threshold THRESHOLD
+                            largest fingerprint distance (0-1) of duplicates. Default is 0.05.
+  --drop                    delete duplicate frames.
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from utils.metadata import DUPLICATE_THRESHOLD, INDEX_COLUMNS, INDEX_FILE
+from utils.metadata import find_duplicates, list_sequences, load_index, save_index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str, help="root directory of the dataset, or directory of a single sequence.")
+    parser.add_argument("-t", "--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help=f"largest fingerprint distance (0-1) of duplicates. Default is {DUPLICATE_THRESHOLD}.")
+    parser.add_argument("--drop", action='store_true', help="delete duplicate frames.")
+    return parser.parse_args()
+
+
+def drop_frames(seq_dir, item_ids):
+    """Deletes the files of frames in a sequence."""
+    for item_id in item_ids:
+        for f in (f'images/rgb_{item_id:04}.tiff', f'depth_maps/depth_{item_id:04}.npy',
+                  f'normals/normals_{item_id:04}.npy', f'masks/mask_{item_id:04}.png'):
+            if os.path.exists(os.path.join(seq_dir, f)):
+                os.remove(os.path.join(seq_dir, f))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if os.path.exists(os.path.join(args.path, INDEX_FILE)):
+        sequences = [args.path]
+    else:
+        sequences = [seq_dir for _, _, seq_dir in list_sequences(args.path)]
+
+    total, duplicates = 0, 0
+    for seq_dir in sequences:
+        try:
+            index = load_index(seq_dir)
+        except FileNotFoundError:
+            index = {}
+        if len(index) < len(INDEX_COLUMNS):
+            print(f"{seq_dir}: no index with fingerprints, run build_index.py -f on the dataset first")
+            continue
+
+        duplicate = find_duplicates(index, args.threshold)
+        total += len(duplicate)
+        duplicates += np.count_nonzero(duplicate)
+        print(f"{seq_dir}: {np.count_nonzero(duplicate)} of {len(duplicate)} frames are duplicates",
+              index['item_id'][duplicate].tolist())
+
+        if args.drop and duplicate.any():
+            drop_frames(seq_dir, index['item_id'][duplicate])
+            save_index(seq_dir, {column: values[~duplicate] for column, values in index.items()})
+
+    print(f"{'Dropped' if args.drop else 'Found'} {duplicates} duplicates in {total} frames")
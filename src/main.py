@@ -1,7 +1,7 @@
 # coding: utf-8
 """A command-line program to collect RGB-D data using Kinect V2.
 
-usage: main.py [-h] [-l DELAY] [-d DURATION] [-r RATE] [-s] [-n] [-x X] [-X X] [-y Y] [-Y Y] [-z DEPTH] path
+usage: main.py [-h] [-l DELAY] [-d DURATION] [-r RATE] [-s] [-n] [--noise_area NOISE_AREA] [--noise_scale NOISE_SCALE] [-x X] [-X X] [-y Y] [-Y Y] [-z DEPTH] [--dedup DEDUP] [--uint16] path
 
 positional arguments:
   path                  Output directory for saving data.
@@ -15,20 +15,31 @@ optional arguments:
   -r RATE, --rate RATE  Frame rate of the recording in frames per second. Default is 0, whichrecords as many frames as possible.
   -s, --skin            Remove skin in images.
   -n, --noise           Remove small artefacts in images.
+  --noise_area NOISE_AREA
+                        Keep all regions of at least this many pixels when removing artefacts. Default is 0, which
+                        keeps only the largest region.
+  --noise_scale NOISE_SCALE
+                        Factor to downsample the mask by when removing artefacts, which is faster but may join
+                        regions closer than that many pixels. Default is 1.
   -x X, --x X           Number of pixels to crop viewport on left. Default is 0.
   -X X, --X X           Number of pixels to crop viewport on right. Default is 0.
   -y Y, --y Y           Number of pixels to crop viewport on top. Default is 0.
   -Y Y, --Y Y           Number of pixels to crop viewport on bottom. Default is 0.
   -z DEPTH, --depth DEPTH
                         Maximum range of depth to capture. Default is 4500. Must be 500 < value <= 4500.
+  --dedup DEDUP         Skip saving frames within this fingerprint distance (0-1) of the last saved frame, e.g. 0.05.
+                        Default is 0, which saves all frames.
+  --uint16              Save depth maps as 16-bit fixed-point numbers instead of float32, which halves their size.
 """
 import argparse
 import os
 
+import numpy as np
 from cv2 import cv2
 
 from models import KinectV2
-from utils import create_view, create_save_directories, save_frame
+from utils import create_view, create_save_directories, save_frame, set_precision
+from utils.metadata import fingerprint, fingerprint_distance
 
 
 def parse_arguments():
@@ -46,6 +57,12 @@ def parse_arguments():
 
     parser.add_argument('-s', '--skin', action='store_true', help="Remove skin in images.")
     parser.add_argument('-n', '--noise', action='store_true', help="Remove small artefacts in images.")
+    parser.add_argument('--noise_area', type=int, default=0,
+                        help="Keep all regions of at least this many pixels when removing artefacts. Default is 0, "
+                             "which keeps only the largest region.")
+    parser.add_argument('--noise_scale', type=int, default=1,
+                        help="Factor to downsample the mask by when removing artefacts, which is faster but may join "
+                             "regions closer than that many pixels. Default is 1.")
 
     parser.add_argument("-x", "--x", type=int, default=0,
                         help="Number of pixels to crop viewport on left. Default is 0.")
@@ -60,8 +77,19 @@ def parse_arguments():
                         help="Maximum range of depth to capture. Default is 4500. "
                              "Must be 500 < value <= 4500.")
 
+    parser.add_argument('--dedup', type=float, default=0,
+                        help="Skip saving frames within this fingerprint distance (0-1) of the last saved frame, "
+                             "e.g. 0.05. Default is 0, which saves all frames.")
+
+    parser.add_argument('--uint16', action='store_true',
+                        help="Save depth maps as 16-bit fixed-point numbers instead of float32, which halves their size.")
+
     parser.add_argument('--start', type=int, default=0)
-    return parser.parse_args()
+
+    args = parser.parse_args()
+    if args.noise_scale < 1:
+        parser.error("argument --noise_scale: must be at least 1")
+    return args
 
 
 def init_sequence():
@@ -151,12 +179,16 @@ def main(args):
         # Make directories for saving data
         create_save_directories(path)
 
+    if args.uint16:
+        set_precision(depth_storage=np.uint16)
+
     item_id = args.start  # id of the current item in sequence, incremented at each iteration
+    last_fingerprint = None  # fingerprint of the last saved frame, for skipping duplicates
 
     def callback(frame):
         """Callback function where new frames from camera are received.
 
-        :param frame The current frame, containing RGB-D + Normals data and a foreground mask."""
+        :param frame The current `RGBDFrame`, containing RGB-D data and a foreground mask."""
 
         # View the frame in an OpenCV window
         cv2.imshow('Kinect Scanner', create_view(frame))
@@ -166,10 +198,19 @@ def main(args):
             raise KeyboardInterrupt
         elif key == ord('p'):
             if args.path:
+                # Skip frames which are nearly the same as the last saved one
+                nonlocal item_id, last_fingerprint
+                current = None
+                if args.dedup > 0:
+                    current = fingerprint(frame.color, frame.depth, frame.mask)
+                    if last_fingerprint is not None and fingerprint_distance(current, last_fingerprint) <= args.dedup:
+                        print("Skipping duplicate frame")
+                        return
+                    last_fingerprint = current
+
                 # Save frame data
-                nonlocal item_id
                 print(f"Capturing frame # {item_id}...")
-                save_frame(path, item_id, frame)
+                save_frame(path, item_id, frame, fingerprint=current)  # reuse the fingerprint for the index
                 print("Done")
                 item_id += 1
 
@@ -181,7 +222,9 @@ def main(args):
                     ),
                     filters=KinectV2.Filters(
                         skin=args.skin,
-                        noise=args.noise
+                        noise=args.noise,
+                        noise_area=args.noise_area or None,
+                        noise_scale=args.noise_scale
                     ),
                     viewport=KinectV2.Viewport(
                         left=args.x,
@@ -2,38 +2,52 @@ import time
 import traceback
 
 import numpy as np
+import pylibfreenect2.libfreenect2 as libfreenect2
 from pylibfreenect2 import LoggerLevel, createConsoleLogger, setGlobalLogger
 from pylibfreenect2.libfreenect2 import Freenect2, Freenect2Device, Frame, FrameMap, FrameType
-from pylibfreenect2.libfreenect2 import Registration, SyncMultiFrameListener
-from utils import segment, dmap2norm
+from pylibfreenect2.libfreenect2 import ColorCameraParams, IrCameraParams, Registration, SyncMultiFrameListener
+from utils import RGBDFrame, segment, dmap2norm
+from utils.calibration import CACHE_DIR, COLOR_PARAMS, IR_PARAMS
+from utils.calibration import dict2params, is_complete, load_calibration, params2dict, save_calibration
+
+# Packet pipelines in order of preference
+PIPELINES = ('OpenGLPacketPipeline', 'OpenCLPacketPipeline', 'CpuPacketPipeline')
 
 
 class Config:
     """Recording configurations."""
 
-    def __init__(self, duration: int, delay: int = 0, rate: float = 0):
+    def __init__(self, duration: int, delay: int = 0, rate: float = 0, cache_dir: str = CACHE_DIR):
         """Initializer.
 
         :param duration: Time in seconds for recording length. To record indefinitely, set duration to 0. Default is 0.
         :param delay: Time to delay the start of recording by. Default is 0, i.e. recording starts immediately.
         :param rate: Limit capture frame rate per second. Default is 0, which captures as many frames as possible.
+        :param cache_dir: Directory for caching the pipeline choice and camera parameters of each device. Set to None
+                          to disable the cache. Default is `~/.cache/kinect_v2`.
         """
         self.duration: int = duration
         self.delay: int = delay
         self.rate: float = rate
+        self.cache_dir: str = cache_dir
 
 
 class Filters:
     """Filters to apply on the data."""
 
-    def __init__(self, skin: bool = True, noise: bool = True):
+    def __init__(self, skin: bool = True, noise: bool = True, noise_area: int = None, noise_scale: int = 1):
         """Initializer
 
         :param skin
         :param noise
+        :param noise_area Keep all regions of at least this many pixels when removing noise. Default is None, which
+                          keeps only the largest region.
+        :param noise_scale Factor to downsample the mask by when removing noise. Default is 1.
         """
         self.skin: bool = skin
         self.noise: bool = noise
+        self.noise_area: int = noise_area
+        self.noise_scale: int = noise_scale
 
 
 class Viewport:
@@ -59,6 +73,84 @@ class Viewport:
         self.far: float = far if near < far <= 4500 else 4500
 
 
+class Stopwatch:
+    """Measures the duration of consecutive startup stages."""
+
+    def __init__(self):
+        self.stages = []
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        """Ends the current stage and starts the next one.
+
+        :param stage: Name of the stage which just ended.
+        """
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Formats the total time and the time spent in each stage."""
+        total = sum(seconds for _, seconds in self.stages)
+        return f"Time to first frame: {total:.2f}s (" + \
+               ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stages) + ")"
+
+
+# noinspection PyBroadException
+def create_pipeline(preferred: str = None):
+    """Creates the first packet pipeline available on this machine.
+
+    :param preferred: Name of the pipeline to try first, e.g. one which worked before. Default is None.
+    :return: Name of the pipeline and the pipeline itself.
+    """
+    names = PIPELINES if preferred not in PIPELINES else (preferred,) + tuple(p for p in PIPELINES if p != preferred)
+    for name in names:
+        try:
+            return name, getattr(libfreenect2, name)()
+        except Exception:
+            continue
+
+    raise RuntimeError("No packet pipeline available!")
+
+
+def warm_up(viewport: Viewport, filters: Filters):
+    """Runs the frame processing once on a synthetic frame.
+
+    OpenCV sets up its thread pool and kernels lazily on first use, which otherwise delays the first real frame.
+
+    :param viewport
+    :param filters
+    """
+    h = max(424 - viewport.top - viewport.bottom, 1)
+    w = max(512 - viewport.left - viewport.right, 1)
+
+    color = np.zeros((h, w, 3), dtype=np.uint8)
+    color[:] = (255, 0, 0)  # blue, so that the skin filter keeps the foreground
+    depth = np.full((h, w), (viewport.near + viewport.far) / 2, dtype=np.float32)
+    depth[:, :w // 2] = 0
+
+    color, depth, mask = segment(color, depth,
+                                 min_depth=viewport.near, max_depth=viewport.far,
+                                 skin=filters.skin, artefacts=filters.noise,
+                                 artefact_area=filters.noise_area, artefact_scale=filters.noise_scale)
+    dmap2norm(depth)
+
+
+def create_registration(ir_params, color_params, viewport: Viewport):
+    """Creates the registration of depth and color frames and the intrinsics matrix of the depth camera.
+
+    :param ir_params: The `IrCameraParams` of the device.
+    :param color_params: The `ColorCameraParams` of the device.
+    :param viewport
+    :return: The `Registration` and the 3x3 intrinsics matrix, shifted by the cropped viewport.
+    """
+    registration = Registration(ir_params, color_params)
+    K = np.array([[ir_params.fx, 0, ir_params.cx - viewport.left],
+                  [0, ir_params.fy, ir_params.cy - viewport.top],
+                  [0, 0, 1]])
+    return registration, K
+
+
 # noinspection PyArgumentList,PyBroadException
 def record(callback,
            config: Config,
@@ -66,27 +158,19 @@ def record(callback,
            viewport: Viewport):
     """Records a sequence of RGB-D images.
 
-    Each datapoint in the sequence is a set of four values, i.e. an RGB image, a depth map,
-    surface normals, and a binary mask, each of them given as a numpy array.
+    Each datapoint in the sequence is an `RGBDFrame` holding an RGB image, a depth map and a
+    binary mask, each of them given as a numpy array. Surface normals are computed on demand.
+
+    The packet pipeline which worked on the last run and the camera parameters are cached per device, so
+    that later runs do not have to probe for a working pipeline again, and set up the registration before
+    the device starts. A breakdown of the time it took to get the first frame is printed when it arrives.
 
     :param callback: A callback function to handle captured frames.
     :param config: Configurations for recording the sequence.
     :param filters
     :param viewport
     """
-    try:
-        from pylibfreenect2.libfreenect2 import OpenGLPacketPipeline
-
-        pipeline = OpenGLPacketPipeline()
-    except:
-        try:
-            from pylibfreenect2.libfreenect2 import OpenCLPacketPipeline
-
-            pipeline = OpenCLPacketPipeline()
-        except:
-            from pylibfreenect2.libfreenect2 import CpuPacketPipeline
-
-            pipeline = CpuPacketPipeline()
+    stopwatch = Stopwatch()
 
     logger = createConsoleLogger(LoggerLevel.NONE)
     setGlobalLogger(logger)
@@ -97,13 +181,21 @@ def record(callback,
         raise RuntimeError("No device connected!")
 
     serial = fn.getDeviceSerialNumber(0)
+    calibration = load_calibration(serial, config.cache_dir) if config.cache_dir else None
+    stopwatch.lap("enumerate")
+
+    pipeline_name, pipeline = create_pipeline(calibration["pipeline"] if calibration else None)
+    stopwatch.lap("pipeline")
+
     device: Freenect2Device = fn.openDevice(serial, pipeline=pipeline)
 
     listener = SyncMultiFrameListener(FrameType.Color | FrameType.Ir | FrameType.Depth)
     device.setColorFrameListener(listener)
     device.setIrAndDepthFrameListener(listener)
+    stopwatch.lap("open")
 
     print(f"Configuration:"
+          f"\n  Pipeline: {pipeline_name}"
           f"\n  Filters: "
           f"Skin={filters.skin}, "
           f"Noise={filters.noise}"
@@ -112,10 +204,27 @@ def record(callback,
           f"y=({viewport.top},H-{viewport.bottom}), "
           f"z=({viewport.near},{viewport.far})")
 
-    # Wait specified number of seconds before starting image capture
+    # Output buffers of the registration, reused for all frames
+    undistorted = Frame(512, 424, 4)
+    registered = Frame(512, 424, 4)
+
+    # Set up the registration from cached camera parameters, so that it is ready before the device starts,
+    # unless some of them are missing, which would leave them at zero
+    calibrated = is_complete(calibration)
+    if calibrated:
+        registration, K = create_registration(dict2params(calibration["ir"], IrCameraParams()),
+                                              dict2params(calibration["color"], ColorCameraParams()), viewport)
+        stopwatch.lap("registration")
+
+    # Wait specified number of seconds before starting image capture, warming up the frame processing meanwhile
     print(f"Starting in {config.delay} seconds")
     if config.delay > 0:
-        time.sleep(config.delay)
+        warm_up(viewport, filters)
+        stopwatch.lap("warm-up")
+
+        # Only sleep for the rest of the delay
+        time.sleep(max(config.delay - stopwatch.stages[-1][1], 0))
+        stopwatch.lap("delay")
 
     device.start()
     print("Recording", f"for {config.duration} seconds" if config.duration > 0 else "until interrupted",
@@ -125,19 +234,38 @@ def record(callback,
     last_time = start_time + 0.0001
 
     # must be called after device.start()
-    registration = Registration(device.getIrCameraParams(),
-                                device.getColorCameraParams())
+    ir_params = device.getIrCameraParams()
+    color_params = device.getColorCameraParams()
+    stopwatch.lap("start")
+
+    # Only rebuild the registration if the device reports other parameters than the cached ones, which
+    # includes the device reporting fewer of them
+    current = {"pipeline": pipeline_name,
+               "ir": params2dict(ir_params, IR_PARAMS),
+               "color": params2dict(color_params, COLOR_PARAMS)}
+    if not calibrated or current["ir"] != calibration["ir"] or current["color"] != calibration["color"]:
+        registration, K = create_registration(ir_params, color_params, viewport)
+        stopwatch.lap("registration")
+
+    if config.cache_dir and current != calibration:
+        save_calibration(serial, current, config.cache_dir)
+
+    # Without a delay, warm up while the sensor is busy delivering its first frame
+    if config.delay <= 0:
+        warm_up(viewport, filters)
+        stopwatch.lap("warm-up")
 
     count = 0
     while True:
         try:
             frames = FrameMap()
             listener.waitForNewFrame(frames)
+            timestamp = time.time()  # capture time, before registration and segmentation
+            if count == 0:
+                stopwatch.lap("first frame")
 
             color = frames[FrameType.Color]  # Dimensions: 1920 x 1080, FoV: 84.1° x 53.8°
             depth = frames[FrameType.Depth]  # Dimensions: 512 x 424, FoV: 70.6° x 60°
-            undistorted = Frame(512, 424, 4)
-            registered = Frame(512, 424, 4)
 
             # Combine frames of depth and color camera
             registration.apply(color, depth, undistorted, registered, enable_filter=False)
@@ -162,16 +290,23 @@ def record(callback,
                 color = color[:-viewport.bottom, :, :]
                 depth = depth[:-viewport.bottom, :]
 
+            # Copy color out of the reused registration buffer, as it is modified in place below
+            color = np.ascontiguousarray(color)
+
             # Remove undesired surfaces
             color, depth, mask = segment(color, depth,
                                          min_depth=viewport.near, max_depth=viewport.far,
-                                         skin=filters.skin, artefacts=filters.noise)
+                                         skin=filters.skin, artefacts=filters.noise,
+                                         artefact_area=filters.noise_area, artefact_scale=filters.noise_scale)
+
+            frame = RGBDFrame(color, depth, mask, seq=count, timestamp=timestamp,
+                              viewport=viewport, filters=filters, K=K)
 
-            # Compute surface normals from depth map
-            norms = dmap2norm(depth)
-            norms[mask] = 0
+            if count == 0:
+                stopwatch.lap("processing")
+                print(stopwatch.report())
 
-            callback((color, depth, norms, mask))  # RGB-D+Normals data + Foreground mask
+            callback(frame)  # RGB-D data + Foreground mask, normals on demand
             listener.release(frames)
             count += 1
 
@@ -7,6 +7,7 @@ import numpy as np
 import time
 
 from torch.utils.data import DataLoader
+from utils import create_view
 from utils.data import RGBDRealDataset
 
 
@@ -1,7 +1,10 @@
 import numpy as np
 from cv2 import cv2
 
+from .calibration import load_calibration, save_calibration
 from .depth3d import dmap2norm, dmap2pcloud, dmap2obj
+from .frame import RGBDFrame
+from .precision import get_precision, set_precision
 from .saver import create_save_directories, save_frame
 from .segmentation import segment
 
@@ -9,22 +12,26 @@ from .segmentation import segment
 def create_view(frame):
     """Show current frame of the RGB-D dataset as images.
 
-    :param frame:
-    :return:
+    The arrays of the frame are left unchanged.
+
+    :param frame: An `RGBDFrame`, or a tuple of color, depth, normals and mask.
+    :return: The color image, mask, colored depth map and normals side by side as one BGR image.
     """
-    color, depth, norms, mask = frame
+    if isinstance(frame, RGBDFrame):
+        return frame.preview
 
-    # apply a colormap on grayscale depth map, makes easier to see depth changes
-    depth = cv2.applyColorMap((depth * 255.0).astype(np.uint8), cv2.COLORMAP_JET)
+    color, depth, norms, mask = frame
 
     # noinspection PyPep8Naming
     WINDOW_BG = 128  # gray window background
+    background = mask[:, :, None]
+
+    # apply a colormap on grayscale depth map, makes easier to see depth changes
+    depth = cv2.applyColorMap(cv2.convertScaleAbs(depth, alpha=255), cv2.COLORMAP_JET)
     depth[mask] = WINDOW_BG
-    color[mask] = WINDOW_BG
-    norms[mask] = WINDOW_BG / 255  # (divide by 255 because normal values are in range 0-1)
 
-    mask2 = cv2.cvtColor(np.logical_not(mask).astype('uint8') * 255, cv2.COLOR_GRAY2BGR)
-    mask2[mask] = WINDOW_BG
+    color = np.where(background, np.uint8(WINDOW_BG), color)
+    norms = np.where(background, np.uint8(WINDOW_BG), cv2.convertScaleAbs(norms, alpha=255))
+    mask2 = np.where(background, np.uint8(WINDOW_BG), np.uint8(255)).repeat(3, axis=2)
 
-    dst = np.hstack((color / 255, mask2 * 255, depth / 255, norms))
-    return (dst * 255).astype(np.uint8)
+    return np.hstack((color, mask2, depth, norms))
@@ -0,0 +1,88 @@
+import json
+import os
+
+# Default location of the per-device cache
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'kinect_v2')
+
+# Intrinsic parameters of the IR (depth) camera, as named by libfreenect2
+IR_PARAMS = ('fx', 'fy', 'cx', 'cy', 'k1', 'k2', 'k3', 'p1', 'p2')
+
+# Intrinsic parameters of the color camera and the depth-to-color mapping coefficients, as named by libfreenect2
+COLOR_PARAMS = ('fx', 'fy', 'cx', 'cy', 'shift_d', 'shift_m',
+                'mx_x3y0', 'mx_x0y3', 'mx_x2y1', 'mx_x1y2', 'mx_x2y0',
+                'mx_x0y2', 'mx_x1y1', 'mx_x1y0', 'mx_x0y1', 'mx_x0y0',
+                'my_x3y0', 'my_x0y3', 'my_x2y1', 'my_x1y2', 'my_x2y0',
+                'my_x0y2', 'my_x1y1', 'my_x1y0', 'my_x0y1', 'my_x0y0')
+
+
+def params2dict(params, names):
+    """Converts camera parameters reported by the device to a plain dictionary.
+
+    Parameters which are not exposed by the Python bindings are left out.
+
+    :param params: An `IrCameraParams` or `ColorCameraParams` instance.
+    :param names: Names of the parameters to read, i.e. `IR_PARAMS` or `COLOR_PARAMS`.
+    :return: Dictionary mapping parameter names to their values.
+    """
+    return {name: float(getattr(params, name)) for name in names if hasattr(params, name)}
+
+
+def dict2params(values, params):
+    """Sets camera parameters from a dictionary, e.g. one loaded from the cache.
+
+    :param values: Dictionary mapping parameter names to their values, see `params2dict`.
+    :param params: An `IrCameraParams` or `ColorCameraParams` instance to fill.
+    :return: The filled parameters.
+    """
+    for name, value in values.items():
+        setattr(params, name, value)
+    return params
+
+
+def is_complete(calibration):
+    """Checks whether a calibration holds every camera parameter needed to register depth and color frames.
+
+    Parameters which the Python bindings do not expose are missing from calibrations saved with them.
+
+    :param calibration: Dictionary with keys `ir` and `color`, or None.
+    :return: True if all of `IR_PARAMS` and `COLOR_PARAMS` are given.
+    """
+    return calibration is not None and \
+        all(name in calibration.get("ir", {}) for name in IR_PARAMS) and \
+        all(name in calibration.get("color", {}) for name in COLOR_PARAMS)
+
+
+def calibration_file(serial, cache_dir=CACHE_DIR):
+    """Returns path of the cache file of the device with given serial number."""
+    serial = serial.decode() if isinstance(serial, bytes) else str(serial)
+    return os.path.join(cache_dir, f'{serial}.json')
+
+
+def load_calibration(serial, cache_dir=CACHE_DIR):
+    """Loads the cached pipeline choice and camera parameters of a device.
+
+    :param serial: Serial number of the device.
+    :param cache_dir: Directory where the cache is stored.
+    :return: Dictionary with keys `pipeline`, `ir` and `color`, or None if the device is not cached yet.
+    """
+    try:
+        with open(calibration_file(serial, cache_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_calibration(serial, calibration, cache_dir=CACHE_DIR):
+    """Saves the pipeline choice and camera parameters of a device to the cache.
+
+    The file is replaced atomically, so that a crash while writing never leaves a corrupt cache behind.
+
+    :param serial: Serial number of the device.
+    :param calibration: Dictionary with keys `pipeline`, `ir` and `color`.
+    :param cache_dir: Directory where the cache is stored.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    outfile = calibration_file(serial, cache_dir)
+    with open(outfile + '.tmp', 'w') as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(outfile + '.tmp', outfile)
@@ -1,20 +1,27 @@
-import os
-
 import cv2
 import numpy as np
 
 from torch.utils.data import Dataset
 from .helpers import ls
+from ..metadata import list_sequences, load_index, sequence_info
+from ..precision import get_precision
 
 
 class RGBDRealDataset(Dataset):
     """Dataset class for loading data from memory."""
 
-    def __init__(self, path, transform=None):
+    def __init__(self, path, transform=None, filters=None):
         """
         Args:
             path (string): Path to the dataset.
-            labels (list): List of labels.
+            transform (callable): Transformation applied on the color images.
+            filters (list of callable): Predicates selecting the frames to
+                load. Each one is called with the metadata index of a sequence
+                (see `utils.metadata`), extended by the `surface`, `lighting`,
+                `material` and `view` of the sequence, and returns a boolean
+                array (or a single boolean) of frames to keep. Frames are only
+                selected by their index, without loading any of their data,
+                e.g. `lambda m: m['fg_fraction'] > 0.2`.
         """
         self.transform = transform
         self.images = []
@@ -22,33 +29,66 @@ class RGBDRealDataset(Dataset):
         self.nmaps = []
         self.masks = []
 
-        objects = sorted(os.listdir(path))
-        for o in objects:
-            obj_dir = os.path.join(path, o)
-            if os.path.isdir(obj_dir):
-                sequences = os.listdir(obj_dir)
-                for s in sequences:
-                    seq_dir = os.path.join(obj_dir, s)
-                    if os.path.isdir(seq_dir):
-                        self.images += [f'{seq_dir}/images/{p}' for p in ls(f'{seq_dir}/images/', '.tiff')]
-                        self.dmaps += [f'{seq_dir}/depth_maps/{p}' for p in ls(f'{seq_dir}/depth_maps/', '.npy')]
-                        self.nmaps += [f'{seq_dir}/normals/{p}' for p in ls(f'{seq_dir}/normals/', '.npy')]
-                        self.masks += [f'{seq_dir}/masks/{p}' for p in ls(f'{seq_dir}/masks/', '.png')]
+        for o, s, seq_dir in list_sequences(path):
+            if filters:
+                for item_id in self._select(seq_dir, o, s, filters):
+                    self.images.append(f'{seq_dir}/images/rgb_{item_id:04}.tiff')
+                    self.dmaps.append(f'{seq_dir}/depth_maps/depth_{item_id:04}.npy')
+                    self.nmaps.append(f'{seq_dir}/normals/normals_{item_id:04}.npy')
+                    self.masks.append(f'{seq_dir}/masks/mask_{item_id:04}.png')
+            else:
+                self.images += [f'{seq_dir}/images/{p}' for p in ls(f'{seq_dir}/images/', '.tiff')]
+                self.dmaps += [f'{seq_dir}/depth_maps/{p}' for p in ls(f'{seq_dir}/depth_maps/', '.npy')]
+                self.nmaps += [f'{seq_dir}/normals/{p}' for p in ls(f'{seq_dir}/normals/', '.npy')]
+                self.masks += [f'{seq_dir}/masks/{p}' for p in ls(f'{seq_dir}/masks/', '.png')]
+
+    @staticmethod
+    def _select(seq_dir, surface, sequence, filters):
+        """Returns ids of the frames in a sequence which pass all filters."""
+        try:
+            index = load_index(seq_dir)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No index in {seq_dir}, run build_index.py on the dataset first")
 
+        meta = dict(index, surface=surface, **sequence_info(sequence))
+        keep = np.ones(len(index['item_id']), dtype=bool)
+        try:
+            for predicate in filters:
+                keep &= predicate(meta)
+        except KeyError as err:
+            raise KeyError(f"No column {err} in the index of {seq_dir}, run build_index.py -f on the dataset first")
+        return index['item_id'][keep]
 
     def __len__(self):
         """Return the size of dataset."""
         return len(self.images)
 
+    def load_image(self, idx):
+        """Load the color image of the item at index idx."""
+        return cv2.imread(self.images[idx])
+
+    def load_depth(self, idx):
+        """Load the depth map of the item at index idx."""
+        return get_precision().decode_depth(np.load(self.dmaps[idx]))
+
+    def load_normals(self, idx):
+        """Load the surface normals of the item at index idx, scaled to a maximum of 1."""
+        nmap = np.load(self.nmaps[idx]).astype(get_precision().dtype, copy=False)
+        nmap /= nmap.max()
+        return nmap
+
+    def load_mask(self, idx):
+        """Load the background mask of the item at index idx."""
+        return cv2.imread(self.masks[idx], 0) < 255
+
     def __getitem__(self, idx):
         """Get the item at index idx."""
 
         # Get the data and label
-        data = cv2.imread(self.images[idx])
-        dmap = np.load(self.dmaps[idx]).astype(np.float32)
-        nmap = np.load(self.nmaps[idx]).astype(np.float32)
-        nmap /= nmap.max()
-        mask = cv2.imread(self.masks[idx], 0) < 255
+        data = self.load_image(idx)
+        dmap = self.load_depth(idx)
+        nmap = self.load_normals(idx)
+        mask = self.load_mask(idx)
 
         # Apply transformation if any
         if self.transform:
@@ -3,26 +3,40 @@ import math
 import numpy as np
 from cv2 import cv2
 
+from .precision import get_precision
+
 
 def dmap2norm(dmap):
     """Computes surface normals from a depth map.
 
+    Normals are computed in the floating-point type of the precision policy, see `utils.precision`.
+
     :param dmap: A grayscale depth map image as a numpy array of size (H,W).
     :return: The corresponding surface normals map as numpy array of size (H,W,3).
     """
-    zx = cv2.Sobel(dmap, cv2.CV_64F, 1, 0, ksize=5)
-    zy = cv2.Sobel(dmap, cv2.CV_64F, 0, 1, ksize=5)
+    dtype = get_precision().dtype
+    dmap = np.asarray(dmap, dtype=dtype)
+    ddepth = cv2.CV_32F if dtype == np.float32 else cv2.CV_64F
+
+    zx = cv2.Sobel(dmap, ddepth, 1, 0, ksize=5)
+    zy = cv2.Sobel(dmap, ddepth, 0, 1, ksize=5)
+
+    # normalize (-zx, -zy, 1), stored in reverse order
+    n = cv2.magnitude(zx, zy)
+    n *= n
+    n += 1
+    np.sqrt(n, out=n)
 
-    normal = np.dstack((-zx, -zy, np.ones_like(dmap)))
-    n = np.linalg.norm(normal, axis=2)
-    normal[:, :, 0] /= n
-    normal[:, :, 1] /= n
-    normal[:, :, 2] /= n
+    normal = np.empty(dmap.shape + (3,), dtype=dtype)
+    np.divide(1, n, out=normal[:, :, 0])
+    np.divide(zy, n, out=normal[:, :, 1])
+    np.divide(zx, n, out=normal[:, :, 2])
+    normal[:, :, 1:] *= -1
 
     # offset and rescale values to be in 0-1
     normal += 1
     normal /= 2
-    return normal[:, :, ::-1]
+    return normal
 
 
 def dmap2pcloud(dmap, K):
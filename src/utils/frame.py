@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+
+from .depth3d import dmap2norm, dmap2pcloud
+
+
+class RGBDFrame:
+    """A captured RGB-D frame.
+
+    Holds the color image, depth map and foreground mask of the frame, together with the
+    settings it was captured with. Derived data, i.e. surface normals, point cloud and the
+    preview image, is only computed when first accessed and then kept for later use.
+
+    For compatibility with code expecting `(color, depth, norms, mask)` tuples, the frame can
+    be unpacked the same way.
+    """
+
+    __slots__ = ('color', 'depth', 'mask', 'seq', 'timestamp', 'viewport', 'filters', 'K',
+                 '_normals', '_pcloud', '_preview')
+
+    def __init__(self, color, depth, mask, seq: int = 0, timestamp: float = None,
+                 viewport=None, filters=None, K=None):
+        """Initializer.
+
+        :param color: The BGR image as a numpy array of size (H,W,3).
+        :param depth: The depth map with values in range 0-1 as a numpy array of size (H,W).
+        :param mask: The background mask as a boolean numpy array of size (H,W).
+        :param seq: Sequence number of the frame in the recording. Default is 0.
+        :param timestamp: Capture time in seconds since the epoch. Default is the current time.
+        :param viewport: The `Viewport` the frame was captured with. Default is None.
+        :param filters: The `Filters` applied on the frame. Default is None.
+        :param K: Intrinsic matrix of the depth camera for the cropped frame, shape (3, 3). Default is None.
+        """
+        self.color = color
+        self.depth = depth
+        self.mask = mask
+        self.seq: int = seq
+        self.timestamp: float = timestamp if timestamp is not None else time.time()
+        self.viewport = viewport
+        self.filters = filters
+        self.K = K
+
+        self._normals = None
+        self._pcloud = None
+        self._preview = None
+
+    @property
+    def normals(self):
+        """Surface normals with values in range 0-1 as a numpy array of size (H,W,3)."""
+        if self._normals is None:
+            self._normals = dmap2norm(self.depth)
+            self._normals[self.mask] = 0
+        return self._normals
+
+    @property
+    def pcloud(self):
+        """Point cloud of the foreground in millimeters as a numpy array of size (P,3)."""
+        if self._pcloud is None:
+            if self.K is None:
+                raise ValueError("Camera intrinsics of the frame are unknown")
+
+            # Undo the normalization of depth values
+            depth = self.depth
+            if self.viewport is not None:
+                depth = np.where(depth > 0, depth * (self.viewport.far - self.viewport.near) + self.viewport.near, 0)
+
+            self._pcloud = dmap2pcloud(depth, self.K)
+        return self._pcloud
+
+    @property
+    def preview(self):
+        """The frame arranged side by side as one BGR image, see `create_view`."""
+        if self._preview is None:
+            from . import create_view
+            self._preview = create_view(tuple(self))
+        return self._preview
+
+    def __iter__(self):
+        return iter((self.color, self.depth, self.normals, self.mask))
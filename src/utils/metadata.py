@@ -0,0 +1,238 @@
+import os
+import re
+
+import numpy as np
+from cv2 import cv2
+
+from .precision import get_precision
+
+# Name of the per-sequence index file
+INDEX_FILE = 'index.npz'
+
+# Width and height of the depth signature of a frame
+SIGNATURE_SIZE = 16
+
+# Columns of the index and their types
+INDEX_COLUMNS = {
+    'item_id': np.int32,  # id of the frame in the sequence, as used in its file names
+    'timestamp': np.float64,  # capture time in seconds since the epoch
+    'fg_fraction': np.float32,  # fraction of foreground pixels
+    'bbox_x0': np.int16,  # foreground bounding box, inclusive-exclusive, all -1 if there is no foreground
+    'bbox_y0': np.int16,
+    'bbox_x1': np.int16,
+    'bbox_y1': np.int16,
+    'depth_min': np.float32,  # statistics of the normalized foreground depth, 0 if there is no foreground
+    'depth_max': np.float32,
+    'depth_mean': np.float32,
+    'holes': np.int16,  # number of background regions enclosed by foreground
+    'dhash': np.uint64,  # difference hash of the color image, see `fingerprint`
+    'signature': (np.uint8, (SIGNATURE_SIZE * SIGNATURE_SIZE,)),  # downsampled depth map, see `fingerprint`
+}
+
+# Default largest fingerprint distance of frames considered duplicates
+DUPLICATE_THRESHOLD = 0.05
+
+# Sequence directory names, as created by `init_sequence`, e.g. NC_front
+SEQUENCE_PATTERN = re.compile(r'^(?P<lighting>[NA])(?P<material>[DWC])_(?P<view>\w+)$')
+
+
+def fingerprint(color, depth, mask):
+    """Computes a compact fingerprint of a frame for finding near-duplicates.
+
+    The fingerprint consists of a 64-bit difference hash of the color image, i.e. whether
+    brightness increases between horizontally neighbouring cells of a 9x8 grid, and a signature
+    of the foreground depth downsampled to `SIGNATURE_SIZE` x `SIGNATURE_SIZE` pixels.
+
+    :param color: The BGR image as a numpy array of size (H,W,3).
+    :param depth: The depth map with values in range 0-1 as a numpy array of size (H,W).
+    :param mask: The background mask as a boolean numpy array of size (H,W).
+    :return: Dictionary with the `dhash` and `signature` columns of the index.
+    """
+    gray = cv2.resize(cv2.cvtColor(color, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    dhash = np.packbits(gray[:, 1:] > gray[:, :-1]).view('>u8')[0]
+
+    depth = np.where(mask, 0, np.clip(depth, 0, 1)).astype(np.float32)
+    signature = cv2.resize(depth, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    return {'dhash': np.uint64(dhash), 'signature': np.round(signature * 255).astype(np.uint8).ravel()}
+
+
+def fingerprint_distance(a, b):
+    """Computes how different frames are by their fingerprints.
+
+    Fingerprints can be single ones or columns of the index, which are compared element-wise.
+
+    :param a: Dictionary with `dhash` and `signature`.
+    :param b: Dictionary with `dhash` and `signature`.
+    :return: The larger of the fraction of differing hash bits and the mean absolute difference of
+             the depth signatures, in range 0-1.
+    """
+    xor = np.bitwise_xor(np.asarray(a['dhash'], dtype=np.uint64), np.asarray(b['dhash'], dtype=np.uint64))
+    bits = np.unpackbits(xor.reshape(-1, 1).view(np.uint8), axis=1).sum(axis=1) / 64
+    diff = np.abs(np.asarray(a['signature'], dtype=np.int16) - np.asarray(b['signature'], dtype=np.int16))
+    depth = diff.reshape(len(bits), -1).mean(axis=1) / 255
+    distance = np.maximum(bits, depth)
+    return distance if np.ndim(a['dhash']) or np.ndim(b['dhash']) else distance[0]
+
+
+def find_duplicates(index, threshold=DUPLICATE_THRESHOLD):
+    """Finds near-duplicate frames in the index of a sequence.
+
+    Frames are visited in order of their ids, and each one is a duplicate if it is within the
+    threshold of the last frame which is not.
+
+    :param index: The index of a sequence, see `load_index`.
+    :param threshold: Largest fingerprint distance of duplicates. Default is `DUPLICATE_THRESHOLD`.
+    :return: Boolean numpy array marking the duplicates.
+    """
+    duplicate = np.zeros(len(index['item_id']), dtype=bool)
+    last = 0
+    for i in range(1, len(duplicate)):
+        distance = fingerprint_distance({k: index[k][last] for k in ('dhash', 'signature')},
+                                        {k: index[k][i] for k in ('dhash', 'signature')})
+        if distance <= threshold:
+            duplicate[i] = True
+        else:
+            last = i
+    return duplicate
+
+
+def frame_metadata(color, depth, mask, timestamp, precomputed=None):
+    """Computes the index entry of a frame.
+
+    :param color: The BGR image as a numpy array of size (H,W,3).
+    :param depth: The depth map with values in range 0-1 as a numpy array of size (H,W).
+    :param mask: The background mask as a boolean numpy array of size (H,W).
+    :param timestamp: Capture time of the frame in seconds since the epoch.
+    :param precomputed: The fingerprint of the frame if it is already known, see `fingerprint`. Default is None.
+    :return: Dictionary with a value for each column in `INDEX_COLUMNS` except `item_id`.
+    """
+    foreground = np.logical_not(mask)
+    meta = {'timestamp': timestamp, 'fg_fraction': np.count_nonzero(foreground) / foreground.size}
+
+    x, y, w, h = cv2.boundingRect(foreground.view(np.uint8))
+    if w > 0:
+        fg_depth = depth[foreground]
+        meta.update(bbox_x0=x, bbox_y0=y, bbox_x1=x + w, bbox_y1=y + h,
+                    depth_min=fg_depth.min(), depth_max=fg_depth.max(), depth_mean=fg_depth.mean())
+    else:
+        meta.update(bbox_x0=-1, bbox_y0=-1, bbox_x1=-1, bbox_y1=-1, depth_min=0, depth_max=0, depth_mean=0)
+
+    # Background regions which do not touch the image border are holes in the foreground
+    nb_components, _, stats, _ = cv2.connectedComponentsWithStats(mask.view(np.uint8), connectivity=4)
+    left, top = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    right, bottom = left + stats[:, cv2.CC_STAT_WIDTH], top + stats[:, cv2.CC_STAT_HEIGHT]
+    enclosed = (left > 0) & (top > 0) & (right < mask.shape[1]) & (bottom < mask.shape[0])
+    meta['holes'] = np.count_nonzero(enclosed[1:])
+
+    meta.update(precomputed if precomputed is not None else fingerprint(color, depth, mask))
+    return meta
+
+
+def load_frame_metadata(path, item_id):
+    """Computes the index entry of a saved frame.
+
+    The modification time of its depth map stands in for the capture time of the frame.
+
+    :param path: Directory of the sequence.
+    :param item_id: Id of the frame.
+    :return: Dictionary with a value for each column in `INDEX_COLUMNS`.
+    """
+    depth_file = f'{path}/depth_maps/depth_{item_id:04}.npy'
+    color = cv2.imread(f'{path}/images/rgb_{item_id:04}.tiff')
+    depth = get_precision().decode_depth(np.load(depth_file))
+    mask = cv2.imread(f'{path}/masks/mask_{item_id:04}.png', 0) < 255
+    return dict(frame_metadata(color, depth, mask, os.path.getmtime(depth_file)), item_id=item_id)
+
+
+def list_frames(path):
+    """Returns ids of the frames saved in a sequence."""
+    matches = (re.match(r'^depth_(\d+)\.npy$', f) for f in os.listdir(f'{path}/depth_maps/'))
+    return sorted(int(m.group(1)) for m in matches if m)
+
+
+def load_index(path):
+    """Loads the index of a sequence.
+
+    Indexes written by older versions may lack some of the columns in `INDEX_COLUMNS`, which
+    are left out.
+
+    :param path: Directory of the sequence.
+    :return: Dictionary mapping each column in the index to a numpy array, sorted by item id.
+    :raises FileNotFoundError: If the sequence has no index.
+    """
+    with np.load(os.path.join(path, INDEX_FILE)) as index:
+        return {column: index[column] for column in INDEX_COLUMNS if column in index.files}
+
+
+def save_index(path, index):
+    """Saves the index of a sequence, replacing any existing one.
+
+    :param path: Directory of the sequence.
+    :param index: Dictionary mapping each column in `INDEX_COLUMNS` to a sequence of values.
+    """
+    order = np.argsort(index['item_id'], kind='stable')
+    columns = {column: _column(index[column], dtype)[order] for column, dtype in INDEX_COLUMNS.items()}
+
+    outfile = os.path.join(path, INDEX_FILE)
+    with open(outfile + '.tmp', 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(outfile + '.tmp', outfile)
+
+
+def update_index(path, item_id, meta):
+    """Adds or replaces the entry of a frame in the index of a sequence.
+
+    An index written by an older version, which lacks some columns, is rebuilt from the saved
+    frames first.
+
+    :param path: Directory of the sequence.
+    :param item_id: Id of the frame.
+    :param meta: Index entry of the frame, see `frame_metadata`.
+    """
+    try:
+        index = load_index(path)
+    except FileNotFoundError:
+        index = {column: _column([], dtype) for column, dtype in INDEX_COLUMNS.items()}
+
+    if len(index) < len(INDEX_COLUMNS):
+        entries = [load_frame_metadata(path, i) for i in list_frames(path) if i != item_id]
+        index = {column: _column([entry[column] for entry in entries], dtype)
+                 for column, dtype in INDEX_COLUMNS.items()}
+
+    keep = index['item_id'] != item_id
+    meta = dict(meta, item_id=item_id)
+    save_index(path, {column: np.concatenate((index[column][keep], _column([meta[column]], dtype)))
+                      for column, dtype in INDEX_COLUMNS.items()})
+
+
+def _column(values, dtype):
+    """Converts values to an index column of given type, which may include a shape per entry."""
+    dtype = np.dtype(dtype)
+    return np.asarray(values, dtype=dtype.base).reshape((-1,) + dtype.shape)
+
+
+def sequence_info(name):
+    """Parses lighting, material and viewing direction from the directory name of a sequence.
+
+    :param name: Directory name of the sequence, e.g. NC_front.
+    :return: Dictionary with keys `lighting`, `material` and `view`, empty strings if the name does not match.
+    """
+    match = SEQUENCE_PATTERN.match(name)
+    return match.groupdict() if match else {'lighting': '', 'material': '', 'view': ''}
+
+
+def list_sequences(path):
+    """Lists the sequences of a dataset saved with `main.py`, which are stored as `path/<surface>/<sequence>/`.
+
+    :param path: Root directory of the dataset.
+    :return: List with the surface name, sequence name and directory of each sequence.
+    """
+    sequences = []
+    for o in sorted(os.listdir(path)):
+        obj_dir = os.path.join(path, o)
+        if os.path.isdir(obj_dir):
+            for s in os.listdir(obj_dir):
+                seq_dir = os.path.join(obj_dir, s)
+                if os.path.isdir(seq_dir):
+                    sequences.append((o, s, seq_dir))
+    return sequences
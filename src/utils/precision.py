@@ -0,0 +1,52 @@
+import numpy as np
+
+# Largest value of depth stored as fixed-point, which stands for a normalized depth of 1
+DEPTH_SCALE = np.iinfo(np.uint16).max
+
+
+class Precision:
+    """Numeric types of frames throughout the pipeline.
+
+    Depth maps and surface normals are computed and loaded as `dtype`, and images stay uint8.
+    Depth maps are saved either as `dtype` or as uint16 fixed-point numbers, which halves
+    their size. Saved depth maps carry their type, so datasets may mix both.
+    """
+
+    def __init__(self, dtype=np.float32, depth_storage=np.float32):
+        """Initializer.
+
+        :param dtype: Floating-point type of depth maps and surface normals. Default is float32.
+        :param depth_storage: Type of saved depth maps, either a floating-point type or uint16. Default is float32.
+        """
+        self.dtype = np.dtype(dtype)
+        self.depth_storage = np.dtype(depth_storage)
+
+    def encode_depth(self, depth):
+        """Converts a depth map with values in range 0-1 to its stored type."""
+        if self.depth_storage == np.uint16:
+            return np.clip(depth * self.dtype.type(DEPTH_SCALE) + self.dtype.type(0.5), 0, DEPTH_SCALE).astype(np.uint16)
+        return np.asarray(depth, dtype=self.depth_storage)
+
+    def decode_depth(self, depth):
+        """Converts a stored depth map back to values in range 0-1."""
+        if depth.dtype == np.uint16:
+            decoded = depth.astype(self.dtype)
+            decoded *= self.dtype.type(1 / DEPTH_SCALE)
+            return decoded
+        return np.asarray(depth, dtype=self.dtype)
+
+
+# The precision used throughout the pipeline
+policy = Precision()
+
+
+def set_precision(dtype=np.float32, depth_storage=np.float32):
+    """Sets the precision used throughout the pipeline, see `Precision`."""
+    global policy
+    policy = Precision(dtype, depth_storage)
+    return policy
+
+
+def get_precision():
+    """Returns the precision used throughout the pipeline."""
+    return policy
@@ -0,0 +1,171 @@
+import numpy as np
+from cv2 import cv2
+
+from .calibration import COLOR_PARAMS, IR_PARAMS
+
+# Resolutions of the depth and color cameras as (H, W)
+DEPTH_SIZE = (424, 512)
+COLOR_SIZE = (1080, 1920)
+
+# Constants of the depth-to-color mapping, as defined by libfreenect2
+DEPTH_Q = 0.01
+COLOR_Q = 0.002199
+
+# Window around each mapped depth pixel used to detect occlusions, and the tolerance of the check
+FILTER_WIDTH_HALF = 2
+FILTER_HEIGHT_HALF = 1
+FILTER_TOLERANCE = 0.01
+
+
+class Registration:
+    """Combines frames of the depth and color cameras, like libfreenect2's `Registration`.
+
+    The undistortion and depth-to-color mapping of every depth pixel is precomputed once
+    from the camera parameters. Frames are then registered with a few vectorized gathers,
+    which works offline on saved frames and on batches of frames alike.
+    """
+
+    def __init__(self, ir: dict, color: dict):
+        """Initializer.
+
+        :param ir: Parameters of the IR camera, with the names in `IR_PARAMS`.
+        :param color: Parameters of the color camera, with the names in `COLOR_PARAMS`.
+        """
+        missing = [f"ir.{p}" for p in IR_PARAMS if p not in ir] + \
+                  [f"color.{p}" for p in COLOR_PARAMS if p not in color]
+        if missing:
+            raise ValueError(f"Camera parameters incomplete, missing {', '.join(missing)}")
+
+        self.ir = {p: np.float32(ir[p]) for p in IR_PARAMS}
+        self.color = {p: np.float32(color[p]) for p in COLOR_PARAMS}
+
+        h, w = DEPTH_SIZE
+        y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+
+        # Index of the distorted depth pixel for each undistorted one, -1 if outside the image
+        mx, my = self._distort(x, y)
+        ix = (mx + np.float32(0.5)).astype(np.int32)
+        iy = (my + np.float32(0.5)).astype(np.int32)
+        inside = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+        self.distort_map = np.where(inside, iy * w + ix, -1).ravel()
+
+        # Depth-independent part of the column and the row of each depth pixel in the color image
+        rx, ry = self._depth_to_color(x, y)
+        self.depth_to_color_map_x = rx.ravel()
+        self.depth_to_color_map_yi = (ry + np.float32(0.5)).astype(np.int32).ravel()
+
+    @classmethod
+    def from_calibration(cls, calibration: dict):
+        """Creates the registration from cached camera parameters, see `utils.calibration.load_calibration`."""
+        return cls(calibration['ir'], calibration['color'])
+
+    def _distort(self, x, y):
+        d = self.ir
+        dx = (x - d['cx']) / d['fx']
+        dy = (y - d['cy']) / d['fy']
+        dx2 = dx * dx
+        dy2 = dy * dy
+        r2 = dx2 + dy2
+        dxdy2 = 2 * dx * dy
+        kr = 1 + ((d['k3'] * r2 + d['k2']) * r2 + d['k1']) * r2
+        mx = d['fx'] * (dx * kr + d['p2'] * (r2 + 2 * dx2) + d['p1'] * dxdy2) + d['cx']
+        my = d['fy'] * (dy * kr + d['p1'] * (r2 + 2 * dy2) + d['p2'] * dxdy2) + d['cy']
+        return mx, my
+
+    def _depth_to_color(self, x, y):
+        d, c = self.ir, self.color
+        mx = (x - d['cx']) * np.float32(DEPTH_Q)
+        my = (y - d['cy']) * np.float32(DEPTH_Q)
+
+        def poly(prefix):
+            return (mx * mx * mx * c[prefix + 'x3y0']) + (my * my * my * c[prefix + 'x0y3']) + \
+                   (mx * mx * my * c[prefix + 'x2y1']) + (my * my * mx * c[prefix + 'x1y2']) + \
+                   (mx * mx * c[prefix + 'x2y0']) + (my * my * c[prefix + 'x0y2']) + (mx * my * c[prefix + 'x1y1']) + \
+                   (mx * c[prefix + 'x1y0']) + (my * c[prefix + 'x0y1']) + c[prefix + 'x0y0']
+
+        rx = (poly('mx_') / (c['fx'] * np.float32(COLOR_Q))) - (c['shift_m'] / c['shift_d'])
+        ry = (poly('my_') / np.float32(COLOR_Q)) + c['cy']
+        return rx, ry
+
+    def apply(self, color, depth, enable_filter: bool = False, bigdepth: bool = False):
+        """Maps a color image onto the depth image.
+
+        :param color: Color image(s) as a numpy array of size (1080,1920,C) or (N,1080,1920,C).
+        :param depth: Raw depth map(s) in millimeters as a numpy array of size (424,512) or (N,424,512).
+        :param enable_filter: Whether to drop color pixels which are occluded from the depth camera. Default is False.
+        :param bigdepth: Whether to also return depth mapped onto the color image. Default is False.
+        :return: Undistorted depth of size (424,512) and registered color of size (424,512,C), with a leading
+                 batch dimension if the input had one. If `bigdepth` is set, also the depth of size (1080,1920)
+                 at each color pixel, with 0 where no depth is known.
+        """
+        single = np.ndim(depth) == 2
+        depth = np.asarray(depth, dtype=np.float32).reshape(-1, DEPTH_SIZE[0] * DEPTH_SIZE[1])
+        n = depth.shape[0]
+        size_color = COLOR_SIZE[0] * COLOR_SIZE[1]
+        color = np.asarray(color).reshape(n * size_color, -1)
+
+        # Undistort depth
+        outside = self.distort_map < 0
+        undistorted = np.take(depth, np.where(outside, 0, self.distort_map), axis=1)
+        undistorted[:, outside] = 0
+
+        # Offset of the color pixel for each depth pixel, -1 if there is none
+        z = undistorted
+        valid = z > 0
+        rx = (self.depth_to_color_map_x + self.color['shift_m'] / np.where(valid, z, 1)) * self.color['fx'] + \
+             (self.color['cx'] + np.float32(0.5))
+        c_off = rx.astype(np.int32) + self.depth_to_color_map_yi * COLOR_SIZE[1]
+        valid &= (c_off >= 0) & (c_off < size_color)
+        c_off[~valid] = -1
+
+        # Gather color pixels of all frames at once
+        registered = np.take(color, np.maximum(c_off, 0) + np.arange(n)[:, None] * size_color, axis=0)
+        registered[~valid] = 0
+
+        if enable_filter or bigdepth:
+            filter_map = self._filter_map(z, c_off, valid)
+
+            if enable_filter:
+                # Drop color pixels where another depth pixel in front of this one maps to
+                min_z = np.take_along_axis(filter_map, np.maximum(c_off, 0) + COLOR_SIZE[1] * FILTER_HEIGHT_HALF, axis=1)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    occluded = (z - min_z) / z > FILTER_TOLERANCE
+                registered[valid & occluded] = 0
+
+        shape = (DEPTH_SIZE if single else (n,) + DEPTH_SIZE)
+        result = (undistorted.reshape(shape), registered.reshape(shape + (-1,)))
+        if bigdepth:
+            big = filter_map[:, COLOR_SIZE[1] * FILTER_HEIGHT_HALF:-COLOR_SIZE[1] * FILTER_HEIGHT_HALF]
+            big[np.isinf(big)] = 0
+            result += (big.reshape(COLOR_SIZE if single else (n,) + COLOR_SIZE),)
+        return result
+
+    @staticmethod
+    def _filter_map(z, c_off, valid):
+        """Computes the smallest depth mapped onto the window around each color pixel.
+
+        The map has a border of `FILTER_HEIGHT_HALF` rows at the top and bottom.
+        """
+        n = z.shape[0]
+        h, w = COLOR_SIZE[0] + 2 * FILTER_HEIGHT_HALF, COLOR_SIZE[1]
+        filter_map = np.full((n, h * w), np.inf, dtype=np.float32)
+
+        batch, pixels = np.nonzero(valid)
+        base = batch * h * w + c_off[batch, pixels] + w * FILTER_HEIGHT_HALF
+        values = z[batch, pixels]
+        np.minimum.at(filter_map.reshape(-1), base, values)
+
+        # Spread each depth over its window, which is a minimum filter of the same size
+        kernel = np.ones((2 * FILTER_HEIGHT_HALF + 1, 2 * FILTER_WIDTH_HALF + 1), dtype=np.uint8)
+        for i in range(n):
+            filter_map[i] = cv2.erode(filter_map[i].reshape(h, w), kernel, borderValue=np.inf).ravel()
+
+        # Windows at the left and right edges continue on the neighbouring rows, as in libfreenect2
+        column = c_off[batch, pixels] % w
+        edge = (column < FILTER_WIDTH_HALF) | (column >= w - FILTER_WIDTH_HALF)
+        window = np.array([r * w + c
+                           for r in range(-FILTER_HEIGHT_HALF, FILTER_HEIGHT_HALF + 1)
+                           for c in range(-FILTER_WIDTH_HALF, FILTER_WIDTH_HALF + 1)])
+        index = np.clip(base[edge, None] + window, 0, n * h * w - 1)
+        np.minimum.at(filter_map.reshape(-1), index.ravel(), np.repeat(values[edge], len(window)))
+        return filter_map
@@ -1,8 +1,12 @@
 import os
+import time
 
 import numpy as np
 from cv2 import cv2
 
+from .metadata import frame_metadata, update_index
+from .precision import get_precision
+
 
 def create_save_directories(path):
     os.makedirs(f'{path}/images/', exist_ok=True)
@@ -11,7 +15,7 @@ def create_save_directories(path):
     os.makedirs(f'{path}/masks/', exist_ok=True)
 
 
-def save_frame(path, item_id, frame):
+def save_frame(path, item_id, frame, index=True, fingerprint=None):
     """Save current frame of the RGB-D dataset.
 
     Color image is a BGR image with three channels, each with values ranging
@@ -19,13 +23,27 @@ def save_frame(path, item_id, frame):
     and the surface normals have values in range 0-1, where each value is a 3D
     vector.
 
+    Depth maps and normals are saved in the types of the precision policy, see
+    `utils.precision`.
+
+    Unless disabled, the frame is also added to the metadata index of the
+    sequence, see `utils.metadata`.
+
     :param path:
     :param item_id:
-    :param frame:
+    :param frame: An `RGBDFrame`, or a tuple of color, depth, normals and mask.
+    :param index: Whether to add the frame to the index of the sequence. Default is True.
+    :param fingerprint: The fingerprint of the frame for the index if it is already known, see
+                        `utils.metadata.fingerprint`. Default is None, which computes it.
     :return:
     """
     color, depth, norms, mask = frame
     cv2.imwrite(f'{path}/images/rgb_{item_id:04}.tiff', color)
-    np.save(f'{path}/depth_maps/depth_{item_id:04}.npy', depth)
-    np.save(f'{path}/normals/normals_{item_id:04}.npy', norms)
+    precision = get_precision()
+    np.save(f'{path}/depth_maps/depth_{item_id:04}.npy', precision.encode_depth(depth))
+    np.save(f'{path}/normals/normals_{item_id:04}.npy', np.asarray(norms, dtype=precision.dtype))
     cv2.imwrite(f'{path}/masks/mask_{item_id:04}.png', np.logical_not(mask).astype('uint8') * 255)
+
+    if index:
+        timestamp = getattr(frame, 'timestamp', None) or time.time()
+        update_index(path, item_id, frame_metadata(color, depth, mask, timestamp, fingerprint))
@@ -1,6 +1,10 @@
+import functools
+
 import numpy as np
 from cv2 import cv2
 
+from .precision import get_precision
+
 
 def normalize_brightness(im_color):
     hsv = cv2.cvtColor(im_color, cv2.COLOR_BGR2HSV)
@@ -10,47 +14,137 @@ def normalize_brightness(im_color):
     return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
 
 
-def mask_skin(im_color):
-    # define the upper and lower boundaries of the HSV pixel
-    # intensities to be considered 'skin'
-    lower = np.array([0, 0, 0], dtype="uint8")
-    upper = np.array([50, 255, 255], dtype="uint8")
+# Lower and upper boundaries of the HSV pixel intensities to be considered 'skin'
+SKIN_LOWER = (0, 0, 0)
+SKIN_UPPER = (50, 255, 255)
+
+
+@functools.lru_cache()
+def build_skin_lut(lower=SKIN_LOWER, upper=SKIN_UPPER):
+    """Builds a lookup table for classifying skin colors.
+
+    The table is indexed by colors quantized to 16-bit BGR565 and holds 255 for
+    skin and 0 otherwise. Each entry is decided by a majority vote of the HSV
+    classification of all 24-bit colors which quantize to it. Entries containing
+    an exact gray follow the classification of the grays instead, as gray has a
+    hue and saturation of 0 in HSV and would otherwise be outvoted by its
+    neighbours. Tables are built once per pair of boundaries and cached.
+
+    :param lower: Lower HSV boundary of skin colors, as a tuple. Default is `SKIN_LOWER`.
+    :param upper: Upper HSV boundary of skin colors, as a tuple. Default is `SKIN_UPPER`.
+    :return: The lookup table as a read-only uint8 numpy array of size 65536.
+    """
+    lower = np.array(lower, dtype="uint8")
+    upper = np.array(upper, dtype="uint8")
+
+    # classify all colors, eight blue levels (i.e. one quantization step) at a time
+    values = np.arange(256, dtype=np.uint8)
+    colors = np.empty((8, 256, 256, 3), dtype=np.uint8)
+    colors[..., 1], colors[..., 2] = np.meshgrid(values, values, indexing='ij')
+
+    votes = np.empty((32, 64, 32), dtype=np.uint16)
+    for b in range(32):
+        colors[..., 0] = values[b * 8:b * 8 + 8, None, None]
+        converted = cv2.cvtColor(colors.reshape(-1, 256, 3), cv2.COLOR_BGR2HSV)
+        skin = cv2.inRange(converted, lower, upper).reshape(8, 64, 4, 32, 8)
+        votes[b] = np.count_nonzero(skin, axis=(0, 2, 4))
+
+    # the first color of each quantization step stands for all of them
+    b, g, r = np.meshgrid(values[::8], values[::4], values[::8], indexing='ij')
+    codes = cv2.cvtColor(np.stack((b, g, r), axis=-1).reshape(-1, 32, 3), cv2.COLOR_BGR2BGR565)
+
+    lut = np.zeros(1 << 16, dtype=np.uint8)
+    lut[codes.view(np.uint16).ravel()] = np.where(votes.ravel() >= 128, 255, 0)
 
-    # convert frame to the HSV color space, and determine the HSV pixel
-    # intensities that fall into the specified upper and lower boundaries
-    converted = cv2.cvtColor(im_color, cv2.COLOR_BGR2HSV)
-    skin_mask = cv2.inRange(converted, lower, upper)
+    # classify entries containing an exact gray like the grays themselves, by a majority vote among them
+    grays = np.repeat(values, 3).reshape(1, 256, 3)
+    gray_codes = cv2.cvtColor(grays, cv2.COLOR_BGR2BGR565).view(np.uint16).ravel()
+    gray_skin = cv2.inRange(cv2.cvtColor(grays, cv2.COLOR_BGR2HSV), lower, upper).ravel() != 0
+    skin_votes = np.bincount(gray_codes, weights=gray_skin, minlength=1 << 16)[gray_codes]
+    gray_votes = np.bincount(gray_codes, minlength=1 << 16)[gray_codes]
+    lut[gray_codes] = np.where(2 * skin_votes >= gray_votes, 255, 0)
 
-    # apply a series of erosions and dilations to the mask
+    lut.setflags(write=False)
+    return lut
+
+
+# Kernels for cleaning up the skin mask
+OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+GROW_KERNEL = np.ones((5, 5), dtype="uint8")
+
+
+def mask_skin(im_color, lower=SKIN_LOWER, upper=SKIN_UPPER):
+    # quantize colors to 16 bits and look up which of them fall into the
+    # specified upper and lower HSV boundaries
+    codes = cv2.cvtColor(im_color, cv2.COLOR_BGR2BGR565).view(np.uint16)[..., 0]
+    # boundaries may be given as numpy arrays, which cannot be cache keys
+    lut = build_skin_lut(tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+    skin_mask = np.take(lut, codes)
+
+    # apply two erosions followed by two dilations to the mask
     # using an elliptical kernel
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-    skin_mask = cv2.erode(skin_mask, kernel, iterations=2)
-    skin_mask = cv2.dilate(skin_mask, kernel, iterations=2)
+    skin_mask = cv2.morphologyEx(skin_mask, cv2.MORPH_OPEN, OPEN_KERNEL, iterations=2)
 
-    # blur the mask to help remove noise, then apply the
-    # mask to the frame
-    skin_mask = cv2.GaussianBlur(skin_mask, (5, 5), 0)
+    # grow the mask by two pixels, which is what thresholding the
+    # mask after a 5x5 Gaussian blur at zero amounts to
+    skin_mask = cv2.dilate(skin_mask, GROW_KERNEL)
     skin_mask = skin_mask != 0
     return skin_mask
 
 
-def artefact_mask(depth, mask):
-    try:
-        copy = np.copy(depth * 255).astype(np.uint8)
-        copy[mask] = 0
-        nb_components, output, stats, _ = cv2.connectedComponentsWithStats(copy, connectivity=4)
-
-        # Find the largest non background component.
-        # Note: range() starts from 1 since 0 is the background label.
-        max_label, max_size = max([(i, stats[i, cv2.CC_STAT_AREA]) for i in range(1, nb_components)],
-                                  key=lambda x: x[1])
-        return output != max_label
-    except Exception as ex:
-        print(ex)
+def artefact_mask(depth, mask, min_area=None, scale=1):
+    """Finds small artefacts, i.e. foreground regions which are not part of the object.
+
+    Foreground pixels are grouped into 4-connected components, and only the largest one, or all
+    components of at least `min_area` pixels, are kept. Labeling can be done on the foreground
+    downsampled by `scale`, where a cell is foreground if any of its pixels is, which is faster
+    but may join components less than `scale` pixels apart.
+
+    :param depth: The normalized depth map as a numpy array of size (H,W).
+    :param mask: The background mask as a boolean numpy array of size (H,W).
+    :param min_area: Keep all components of at least this many pixels. Default is None, which keeps only the largest.
+    :param scale: Factor to downsample the foreground by before labeling. Default is 1.
+    :return: Boolean numpy array of size (H,W), which is False only for kept foreground pixels,
+             or the mask itself if there is no foreground.
+    :raises ValueError: If the scale is less than 1.
+    """
+    if scale < 1:
+        raise ValueError(f"Scale must be at least 1, got {scale}")
+
+    # foreground pixels with a depth of at least one 8-bit step
+    foreground = depth >= 1 / 255
+    foreground &= ~mask
+
+    h, w = foreground.shape
+    cells = foreground.view(np.uint8)
+    if scale > 1:
+        # max over each scale x scale cell, which maps back onto exactly those pixels when upsampling
+        cells = cv2.dilate(cells, np.ones((scale, scale), dtype=np.uint8), anchor=(0, 0))
+        cells = np.ascontiguousarray(cells[::scale, ::scale])
+
+    nb_components, labels, stats, _ = cv2.connectedComponentsWithStats(cells, connectivity=4)
+    if nb_components < 2:
         return mask
 
+    # select components by area, label 0 is the background
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    if min_area is None:
+        kept = labels == np.argmax(areas) + 1
+    else:
+        keep = np.zeros(nb_components, dtype=bool)
+        keep[1:] = areas * scale ** 2 >= min_area
+        kept = np.take(keep, labels)
+
+    if scale > 1:
+        kept = cv2.resize(kept.view(np.uint8), None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        kept = kept[:h, :w].view(bool) & foreground
+    return ~kept
+
+
+def segment(color, depth, min_depth=500, max_depth=1500, skin=True, artefacts=True, artefact_area=None,
+            artefact_scale=1):
+    depth = np.asarray(depth, dtype=get_precision().dtype)
 
-def segment(color, depth, min_depth=500, max_depth=1500, skin=True, artefacts=True):
     # Get background mask (i.e. keep objects 0.5-1.5 meter away from camera)
     mask = np.logical_or(depth > max_depth, depth < min_depth)
 
@@ -59,20 +153,21 @@ def segment(color, depth, min_depth=500, max_depth=1500, skin=True, artefacts=Tr
         mask = np.logical_or(mask, mask_skin(color))
 
     # Normalize depth values between 0-1 and apply mask
-    depth = (depth - min_depth) / (max_depth - min_depth)
+    depth = depth - depth.dtype.type(min_depth)
+    depth /= depth.dtype.type(max_depth - min_depth)
     depth[depth < 0] = 0
 
     # Get mask for small artefacts caused by skin removal
     if artefacts:
-        mask = np.logical_or(mask, artefact_mask(depth, mask))
+        mask = np.logical_or(mask, artefact_mask(depth, mask, min_area=artefact_area, scale=artefact_scale))
 
     # Normalize color image and apply mask
     # color = normalize_brightness(color)
     color[mask] = 0
 
     # Fill holes in depth map and apply mask
-    holes = (depth == 0).astype(np.uint8)
-    depth = cv2.inpaint(depth, holes, 7, cv2.INPAINT_NS)
+    holes = (depth == 0).view(np.uint8)
+    depth = cv2.inpaint(depth.astype(np.float32, copy=False), holes, 7, cv2.INPAINT_NS).astype(depth.dtype, copy=False)
     depth[mask] = 0
 
     return color, depth, mask
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from utils import RGBDFrame, create_save_directories, create_view, save_frame, set_precision
+from utils.depth3d import dmap2norm
+from utils.segmentation import segment
+
+
+@pytest.fixture(params=[np.float32, np.uint16], ids=['float32', 'uint16'])
+def policy(request):
+    yield set_precision(depth_storage=request.param)
+    set_precision()
+
+
+@pytest.fixture
+def raw_frame():
+    """A registered color image and depth map in millimeters, as given by the camera."""
+    rng = np.random.default_rng(0)
+    h, w = 424, 512
+    color = cv2.resize(rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8), (w, h))
+    depth = cv2.resize(rng.uniform(300, 1700, (h // 32, w // 32)).astype(np.float32), (w, h))
+    return color, depth
+
+
+def test_dtypes_through_pipeline(policy, raw_frame, tmp_path):
+    color, depth, mask = segment(*raw_frame)
+    assert color.dtype == np.uint8
+    assert depth.dtype == np.float32
+    assert mask.dtype == bool
+
+    norms = dmap2norm(depth)
+    assert norms.dtype == np.float32
+
+    frame = RGBDFrame(color, depth, mask)
+    assert frame.normals.dtype == np.float32
+
+    assert create_view(frame).dtype == np.uint8
+    assert create_view((color, depth, norms, mask)).dtype == np.uint8
+
+    path = os.path.join(tmp_path, 'surface0', 'ND_front')
+    create_save_directories(path)
+    save_frame(path, 0, frame, index=False)
+    assert np.load(f'{path}/depth_maps/depth_0000.npy').dtype == policy.depth_storage
+    assert np.load(f'{path}/normals/normals_0000.npy').dtype == np.float32
+
+    pytest.importorskip('torch')
+    from utils.data import RGBDRealDataset
+
+    dataset = RGBDRealDataset(str(tmp_path))
+    assert dataset.load_image(0).dtype == np.uint8
+    assert dataset.load_mask(0).dtype == bool
+    assert dataset.load_normals(0).dtype == np.float32
+
+    loaded = dataset.load_depth(0)
+    assert loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, depth, atol=1 / 65535)
@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+
+from utils.registration import COLOR_SIZE, DEPTH_SIZE, FILTER_HEIGHT_HALF, FILTER_TOLERANCE, FILTER_WIDTH_HALF
+from utils.registration import DEPTH_Q, COLOR_Q, Registration
+
+# Typical parameters as in benchmarks/registration.py, with tangential distortion and all polynomial terms
+# of the depth-to-color mapping set, and scaled so that depth pixels map onto the left and right color edges
+IR = {'fx': 365.5, 'fy': 365.5, 'cx': 257.0, 'cy': 205.0,
+      'k1': 0.09, 'k2': -0.27, 'k3': 0.09, 'p1': 0.0013, 'p2': -0.0021}
+COLOR = {'fx': 1081.37, 'fy': 1081.37, 'cx': 959.5, 'cy': 539.5, 'shift_d': 863.0, 'shift_m': 52.0,
+         'mx_x3y0': 0.0012, 'mx_x0y3': 0.0003, 'mx_x2y1': 0.0005, 'mx_x1y2': 0.0011, 'mx_x2y0': 0.0004,
+         'mx_x0y2': 0.0002, 'mx_x1y1': 0.0003, 'mx_x1y0': 0.93, 'mx_x0y1': 0.0021, 'mx_x0y0': 0.0035,
+         'my_x3y0': 0.0002, 'my_x0y3': 0.0009, 'my_x2y1': 0.0007, 'my_x1y2': 0.0001, 'my_x2y0': 0.0003,
+         'my_x0y2': 0.0005, 'my_x1y1': 0.0006, 'my_x1y0': 0.0019, 'my_x0y1': 0.6506, 'my_x0y0': 0.0041}
+
+f32 = np.float32
+
+
+def reference_maps(ir, color, pixels):
+    """libfreenect2's `distort` and `depth_to_color` for single pixels, in float32 as in C++."""
+    d = {k: f32(v) for k, v in ir.items()}
+    c = {k: f32(v) for k, v in color.items()}
+    result = []
+    for x, y in pixels:
+        dx = (f32(x) - d['cx']) / d['fx']
+        dy = (f32(y) - d['cy']) / d['fy']
+        dx2, dy2 = dx * dx, dy * dy
+        r2 = dx2 + dy2
+        dxdy2 = f32(2) * dx * dy
+        kr = f32(1) + ((d['k3'] * r2 + d['k2']) * r2 + d['k1']) * r2
+        mx = d['fx'] * (dx * kr + d['p2'] * (r2 + f32(2) * dx2) + d['p1'] * dxdy2) + d['cx']
+        my = d['fy'] * (dy * kr + d['p1'] * (r2 + f32(2) * dy2) + d['p2'] * dxdy2) + d['cy']
+        ix, iy = int(mx + f32(0.5)), int(my + f32(0.5))
+        index = iy * 512 + ix if 0 <= ix < 512 and 0 <= iy < 424 else -1
+
+        qx = (f32(x) - d['cx']) * f32(DEPTH_Q)
+        qy = (f32(y) - d['cy']) * f32(DEPTH_Q)
+        w = [(qx * qx * qx * c[p + 'x3y0']) + (qy * qy * qy * c[p + 'x0y3']) +
+             (qx * qx * qy * c[p + 'x2y1']) + (qy * qy * qx * c[p + 'x1y2']) +
+             (qx * qx * c[p + 'x2y0']) + (qy * qy * c[p + 'x0y2']) + (qx * qy * c[p + 'x1y1']) +
+             (qx * c[p + 'x1y0']) + (qy * c[p + 'x0y1']) + c[p + 'x0y0'] for p in ('mx_', 'my_')]
+        rx = (w[0] / (c['fx'] * f32(COLOR_Q))) - (c['shift_m'] / c['shift_d'])
+        ry = (w[1] / f32(COLOR_Q)) + c['cy']
+        result.append((index, rx, int(ry + f32(0.5))))
+    return result
+
+
+def reference_apply(registration, color, depth):
+    """libfreenect2's `Registration::apply` with the filter enabled, pixel by pixel.
+
+    :return: Undistorted depth, registered color, filtered registered color, filter map of size
+             (1082,1920) including its border, and the color offset of each depth pixel.
+    """
+    w = COLOR_SIZE[1]
+    size_color = COLOR_SIZE[0] * w
+    c = {k: f32(v) for k, v in registration.color.items()}
+    color_cx = c['cx'] + f32(0.5)
+    rgb = color.reshape(size_color, -1)
+    depth = depth.ravel()
+
+    undistorted = np.zeros(DEPTH_SIZE[0] * DEPTH_SIZE[1], dtype=np.float32)
+    c_offs = np.full(undistorted.shape, -1, dtype=np.int64)
+    filter_map = np.full(size_color + 2 * w * FILTER_HEIGHT_HALF, np.inf, dtype=np.float32)
+    offset_filter_map = w * FILTER_HEIGHT_HALF
+
+    for i, index in enumerate(registration.distort_map):
+        if index < 0:
+            continue
+        z = depth[index]
+        undistorted[i] = z
+        if z <= 0:
+            continue
+        rx = (registration.depth_to_color_map_x[i] + (c['shift_m'] / z)) * c['fx'] + color_cx
+        c_off = int(rx) + int(registration.depth_to_color_map_yi[i]) * w
+        if c_off < 0 or c_off >= size_color:
+            continue
+        c_offs[i] = c_off
+
+        # the window is walked on flat offsets, so it continues on the next or previous row at the edges
+        yi = offset_filter_map + c_off - FILTER_HEIGHT_HALF * w - FILTER_WIDTH_HALF
+        for _ in range(-FILTER_HEIGHT_HALF, FILTER_HEIGHT_HALF + 1):
+            for j in range(yi, yi + 2 * FILTER_WIDTH_HALF + 1):
+                if z < filter_map[j]:
+                    filter_map[j] = z
+            yi += w
+
+    registered = np.zeros((len(undistorted), rgb.shape[1]), dtype=color.dtype)
+    filtered = np.zeros_like(registered)
+    for i in np.flatnonzero(c_offs >= 0):
+        c_off, z = c_offs[i], undistorted[i]
+        registered[i] = rgb[c_off]
+        if not (z - filter_map[offset_filter_map + c_off]) / z > f32(FILTER_TOLERANCE):
+            filtered[i] = rgb[c_off]
+
+    shape = DEPTH_SIZE + (-1,)
+    return (undistorted.reshape(DEPTH_SIZE), registered.reshape(shape), filtered.reshape(shape),
+            filter_map.reshape(-1, w), c_offs)
+
+
+@pytest.fixture(scope='module')
+def registration():
+    return Registration(IR, COLOR)
+
+
+@pytest.fixture(scope='module')
+def frames():
+    rng = np.random.default_rng(0)
+    color = rng.integers(0, 256, (2,) + COLOR_SIZE + (4,), dtype=np.uint8)
+    depth = rng.uniform(500, 4500, (2,) + DEPTH_SIZE).astype(np.float32)
+    depth[rng.random(depth.shape) < 0.05] = 0
+    return color, depth
+
+
+@pytest.fixture(scope='module')
+def reference(registration, frames):
+    color, depth = frames
+    return [reference_apply(registration, color[i], depth[i]) for i in range(len(depth))]
+
+
+def test_maps(registration):
+    rng = np.random.default_rng(1)
+    pixels = [(x, y) for x in (0, 1, 255, 510, 511) for y in (0, 1, 211, 422, 423)]
+    pixels += list(zip(rng.integers(0, 512, 500), rng.integers(0, 424, 500)))
+    for (x, y), (index, rx, yi) in zip(pixels, reference_maps(IR, COLOR, pixels)):
+        i = y * 512 + x
+        assert registration.distort_map[i] == index
+        assert registration.depth_to_color_map_x[i] == rx
+        assert registration.depth_to_color_map_yi[i] == yi
+
+
+def test_covers_edges(reference):
+    columns = reference[0][4][reference[0][4] >= 0] % COLOR_SIZE[1]
+    assert np.any(columns < FILTER_WIDTH_HALF) and np.any(columns >= COLOR_SIZE[1] - FILTER_WIDTH_HALF)
+
+
+def test_apply(registration, frames, reference):
+    color, depth = frames
+    undistorted, registered = registration.apply(color[0], depth[0])
+    np.testing.assert_array_equal(undistorted, reference[0][0])
+    np.testing.assert_array_equal(registered, reference[0][1])
+
+
+def test_apply_filter_bigdepth(registration, frames, reference):
+    color, depth = frames
+    _, registered, big = registration.apply(color[0], depth[0], enable_filter=True, bigdepth=True)
+    np.testing.assert_array_equal(registered, reference[0][2])
+
+    expected = reference[0][3][FILTER_HEIGHT_HALF:-FILTER_HEIGHT_HALF]
+    np.testing.assert_array_equal(big, np.where(np.isinf(expected), 0, expected))
+
+
+def test_apply_batch(registration, frames, reference):
+    color, depth = frames
+    undistorted, registered = registration.apply(color, depth, enable_filter=True)
+    for i in range(len(depth)):
+        np.testing.assert_array_equal(undistorted[i], reference[i][0])
+        np.testing.assert_array_equal(registered[i], reference[i][2])
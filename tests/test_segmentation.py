@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from utils.segmentation import SKIN_LOWER, SKIN_UPPER, build_skin_lut
+
+
+def classify(lut, colors):
+    """Looks up colors of shape (1,N,3) in a skin lookup table."""
+    codes = cv2.cvtColor(colors, cv2.COLOR_BGR2BGR565).view(np.uint16)[..., 0]
+    return np.take(lut, codes).ravel() != 0
+
+
+def classify_hsv(colors, lower, upper):
+    hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8)).ravel() != 0
+
+
+@pytest.mark.parametrize('lower, upper', [(SKIN_LOWER, SKIN_UPPER), ((0, 48, 80), (20, 255, 255)),
+                                          ((100, 50, 50), (130, 255, 255))])
+def test_skin_lut_grays(lower, upper):
+    grays = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+    np.testing.assert_array_equal(classify(build_skin_lut(lower, upper), grays), classify_hsv(grays, lower, upper))
+
+
+@pytest.mark.parametrize('lower, upper', [((0, 48, 80), (20, 255, 255)), ((100, 50, 50), (130, 255, 255))])
+def test_skin_lut_random_colors(lower, upper):
+    colors = np.random.default_rng(0).integers(0, 256, (1, 10000, 3), dtype=np.uint8)
+    agreement = np.mean(classify(build_skin_lut(lower, upper), colors) == classify_hsv(colors, lower, upper))
+    assert agreement > 0.95